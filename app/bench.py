@@ -0,0 +1,197 @@
+"""
+End to end benchmarks on synthetic portfolios of several sizes.
+
+For each scale a portfolio is written with app.synthetic, then these are
+timed, in seconds:
+
+    generate       - build and save investments.xlsx
+    s2db           - load it into investments.db
+    fetch          - TradeHistory, and fetch for every stock in every account
+    match_lots     - match the sells with their buys (FIFO)
+    report         - the PDF report
+    render_charts  - the PDF chart of every stock
+
+Each scale runs in its own process, in its own directory, since app.db
+opens the investments.db of the current directory. The results are
+written as JSON, and can be compared with an earlier run:
+
+    python -m app.bench -s small medium -o bench.json
+    python -m app.bench -s small medium -o new.json -c bench.json
+"""
+
+import argparse
+from contextlib import contextmanager, redirect_stdout
+from datetime import datetime
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+
+# Key is the scale name, value is (n_symbols, n_years, n_trades).
+SCALES = dict(small=(20, 3, 500),
+              medium=(100, 5, 5000),
+              large=(500, 10, 50000))
+
+PHASES = ('generate', 's2db', 'fetch', 'match_lots', 'report', 'render_charts')
+
+TABLES = ('trade_confirmation', 'trade_history', 'activity', 'performance_review', 'realized_gain')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description = globals()['__doc__'],
+                                     formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.usage = 'python -m app.bench [options]'
+    parser.add_argument('-s', '--scales', nargs='*',
+                        choices=sorted(SCALES.keys()),
+                        default=['small', 'medium'],
+                        help='Sizes of portfolio to run. '
+                        'large is %s symbols, %s years, %s trades. '
+                        'Default: %%(default)s.' % SCALES['large'])
+    parser.add_argument('-p', '--phases', nargs='*',
+                        choices=PHASES,
+                        default=PHASES,
+                        help='What to time. generate and s2db always run. '
+                        'Default: all.')
+    parser.add_argument('-o', '--out_file',
+                        default='bench.json',
+                        help='The JSON results file. '
+                        'Default: %(default)s.')
+    parser.add_argument('-c', '--compare',
+                        default=None,
+                        help='An earlier results file to compare with.')
+    parser.add_argument('-w', '--work_dir',
+                        default=None,
+                        help='Directory for the portfolios. '
+                        'Default: a temporary directory.')
+    parser.add_argument('--run', default=None,
+                        help=argparse.SUPPRESS)
+    return parser
+
+
+@contextmanager
+def timer(timings, phase):
+    """
+    Time the block, with its output discarded, into timings[phase].
+    """
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        yield
+    timings[phase] = round(time.perf_counter() - start, 4)
+
+
+def run_scale(name, phases):
+    """
+    Run the benchmarks of one scale, in the current directory. Returns
+    the results as a dict.
+    """
+    from app import synthetic
+    from app.commands import s2db
+    (n_symbols, n_years, n_trades) = SCALES[name]
+    timings = dict()
+    with timer(timings, 'generate'):
+        synthetic.write('.', n_symbols, n_years, n_trades, db=False)
+    with timer(timings, 's2db'):
+        s2db.action(s2db.build_parser().parse_args(['-f', 'investments.xlsx', '-d', 'investments.db']))
+    # app.db finds investments.db when it is imported, so not before it exists.
+    from app.db import database
+    from app.db.trade_history import TradeHistory
+    from app.lots import match_lots
+    if 'fetch' in phases:
+        with timer(timings, 'fetch'):
+            trade_history = TradeHistory()
+            keys = set([(row['account'], row['symbol']) for row in trade_history.rows])
+            for (account, symbol) in sorted(keys):
+                trade_history.fetch(account, symbol)
+    if 'match_lots' in phases:
+        trades = database.fetch_all('trade_confirmation')
+        for trade in trades:
+            trade['trade_date'] = database.fix_date(trade['trade_date'])
+        with timer(timings, 'match_lots'):
+            match_lots(trades)
+    if 'report' in phases:
+        from app.commands import report
+        with timer(timings, 'report'):
+            report.action(report.build_parser().parse_args(['-o', 'report.pdf']))
+    if 'render_charts' in phases:
+        from app.commands import render_charts
+        if not os.path.isdir('charts'):
+            os.mkdir('charts')
+        with timer(timings, 'render_charts'):
+            render_charts.action(render_charts.build_parser().parse_args(['-o', 'charts']))
+    con = sqlite3.connect('investments.db')
+    rows = dict([(table, con.execute('SELECT count(*) FROM %s' % (table,)).fetchone()[0])
+                 for table in TABLES])
+    con.close()
+    return dict(scale=name, n_symbols=n_symbols, n_years=n_years, n_trades=n_trades,
+                rows=rows, timings=timings)
+
+
+def run(args):
+    """
+    Run each scale in a child process. Returns the results.
+    """
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='bench-')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([root] + [path for path in [env.get('PYTHONPATH')] if path])
+    results = []
+    for name in args.scales:
+        scale_dir = os.path.join(work_dir, name)
+        if not os.path.isdir(scale_dir):
+            os.makedirs(scale_dir)
+        output = subprocess.check_output([sys.executable, '-m', 'app.bench', '--run', name,
+                                          '-p'] + list(args.phases),
+                                         cwd=scale_dir, env=env, universal_newlines=True)
+        result = json.loads(output)
+        print('%-8s %s' % (name, '  '.join(['%s %.2fs' % (phase, result['timings'][phase])
+                                              for phase in PHASES if phase in result['timings']])))
+        results.append(result)
+    return dict(date=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                python=platform.python_version(),
+                machine=platform.machine(),
+                work_dir=work_dir,
+                scales=results)
+
+
+def compare(old, new):
+    """
+    Print the timings of new next to those of old, for the scales and
+    phases both have.
+    """
+    old_scales = dict([(result['scale'], result) for result in old['scales']])
+    print('%-8s %-14s %10s %10s %8s' % ('scale', 'phase', 'old', 'new', 'new/old'))
+    for result in new['scales']:
+        old_result = old_scales.get(result['scale'])
+        if old_result is None:
+            continue
+        for phase in PHASES:
+            if phase in result['timings'] and phase in old_result['timings']:
+                old_time = old_result['timings'][phase]
+                new_time = result['timings'][phase]
+                print('%-8s %-14s %10.3f %10.3f %8s'
+                      % (result['scale'], phase, old_time, new_time,
+                         '%.2f' % (new_time / old_time,) if old_time else '-'))
+
+
+def action(args):
+    if args.run:
+        print(json.dumps(run_scale(args.run, args.phases)))
+        return
+    if args.compare and not os.path.exists(args.compare):
+        build_parser().error('%s does not exist' % (args.compare,))
+    results = run(args)
+    with open(args.out_file, 'w') as f:
+        json.dump(results, f, indent=2)
+    print('Results are in', args.out_file)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == '__main__':
+    action(build_parser().parse_args())
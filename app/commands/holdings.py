@@ -0,0 +1,66 @@
+"""
+Show the holdings and cost basis of the accounts on a date, replayed
+from the trade confirmations and activity.
+"""
+
+from app.db.account import Account
+from app.db.activity import Activity
+from app.db import database
+from app.holdings import Holdings
+
+import argparse
+from datetime import datetime
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description = globals()['__doc__'],
+                                     formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.usage = 'python -m app.commands.holdings [options]'
+    parser.add_argument('-a', '--accounts', nargs='*',
+                        default=None,
+                        help='Account numbers or names. Default: all accounts.')
+    parser.add_argument('-d', '--date',
+                        default=None,
+                        help='Date of the holdings, YYYY-MM-DD. Default: today.')
+    return parser
+
+
+class App(object):
+    def __init__(self, args):
+        self.args = args
+        if args.date:
+            self.date = datetime.strptime(args.date, '%Y-%m-%d')
+        else:
+            now = datetime.now()
+            self.date = datetime(now.year, now.month, now.day)
+        self.accounts = Account()
+        trades = database.fetch_all('trade_confirmation')
+        for trade in trades:
+            trade['trade_date'] = database.fix_date(trade['trade_date'])
+        activity = Activity()
+        for act in activity.rows:
+            act['activity_date'] = database.fix_date(act['activity_date'])
+        self.holdings = Holdings(trades, activity.rows)
+
+
+    def report(self):
+        for row in self.accounts.rows:
+            if self.args.accounts and row['number'] not in self.args.accounts \
+               and row['name'] not in self.args.accounts:
+                continue
+            holdings = self.holdings.at(row['number'], self.date)
+            print('%s - %s on %s' % (row['number'], row['name'], self.date.strftime('%Y-%m-%d')))
+            for symbol in sorted(holdings.keys()):
+                (n_shares, cost) = holdings[symbol]
+                print('  %-10s %10g %12.2f %10.2f' % (symbol, n_shares, cost, cost / n_shares))
+
+
+def action(args):
+    """
+    Show the holdings.
+    """
+    App(args).report()
+
+
+if __name__ == '__main__':
+    action(build_parser().parse_args())
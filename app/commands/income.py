@@ -0,0 +1,95 @@
+"""
+Show the dividends and interest of each stock in each account over a
+range of dates (by default the trailing 12 months), with the yield on
+the cost of the shares held at the end.
+
+Example: python -m app.commands.income -e 2023-12-31 -a Individual
+"""
+
+from app.db.account import Account
+from app.db.activity import Activity
+from app.db.income import Income
+from app.db import database
+from app.holdings import Holdings
+from app.income import trailing
+
+import argparse
+from datetime import datetime, timedelta
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description = globals()['__doc__'],
+                                     formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.usage = 'python -m app.commands.income [options]'
+    parser.add_argument('-a', '--accounts', nargs='*',
+                        default=None,
+                        help='Account numbers or names. Default: all accounts.')
+    parser.add_argument('-e', '--end',
+                        default=None,
+                        help='Last date, YYYY-MM-DD. Default: today.')
+    parser.add_argument('-m', '--months', type=int,
+                        default=12,
+                        help='Number of months up to the last date. '
+                        'Default: %(default)s.')
+    parser.add_argument('-s', '--start',
+                        default=None,
+                        help='First date, YYYY-MM-DD, instead of --months.')
+    return parser
+
+
+def date_range(args):
+    """
+    Return the (start, end) of the query, YYYY-MM-DD with end excluded.
+    """
+    if args.end:
+        end = datetime.strptime(args.end, '%Y-%m-%d')
+    else:
+        now = datetime.now()
+        end = datetime(now.year, now.month, now.day)
+    (start, end_excluded) = trailing(end, args.months)
+    if args.start:
+        start = args.start
+    return (start, end_excluded)
+
+
+def cost_basis():
+    """
+    Return the Holdings, to find the cost of the shares held on a date.
+    """
+    trades = database.fetch_all('trade_confirmation')
+    for trade in trades:
+        trade['trade_date'] = database.fix_date(trade['trade_date'])
+    activity = Activity()
+    for act in activity.rows:
+        act['activity_date'] = database.fix_date(act['activity_date'])
+    return Holdings(trades, activity.rows)
+
+
+def action(args):
+    """
+    Print the income.
+    """
+    (start, end) = date_range(args)
+    last = datetime.strptime(end, '%Y-%m-%d') - timedelta(days=1)
+    index = Income().index()
+    holdings = cost_basis()
+    for row in Account().rows:
+        if args.accounts and row['number'] not in args.accounts \
+           and row['name'] not in args.accounts:
+            continue
+        account = row['number']
+        print('%s - %s from %s to %s' % (account, row['name'], start, last.strftime('%Y-%m-%d')))
+        held = holdings.at(account, last)
+        for symbol in index.symbols(account):
+            income = index.total(account, symbol, start, end)
+            if not income:
+                continue
+            cost = held.get(symbol, (0, 0.0))[1]
+            print('  %-24s %12.2f %12s %8s'
+                  % (symbol, income, '%.2f' % (cost,) if cost else '',
+                     '%.2f%%' % (income / cost * 100,) if cost > 0 else ''))
+        print('  %-24s %12.2f' % ('total', index.total(account, None, start, end)))
+
+
+if __name__ == '__main__':
+    action(build_parser().parse_args())
@@ -0,0 +1,135 @@
+"""
+List the open lots in the order they become long term (held more than a
+year), with their unrealized gain at the latest trade_history price.
+
+Example: show the next 10 lots to go long term, or those that will in
+the next 30 days:
+
+    python -m app.commands.long_term -k 10
+    python -m app.commands.long_term -n 30
+"""
+
+from app.db.account import Account
+from app.db.trade_history import TradeHistory
+from app.db import database
+from app.lots import CAPITAL_ASSETS, LotMatcher, long_term_date
+
+import argparse
+from datetime import datetime, timedelta
+import heapq
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description = globals()['__doc__'],
+                                     formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.usage = 'python -m app.commands.long_term [options]'
+    parser.add_argument('-k', '--count', type=int,
+                        default=None,
+                        help='Show only the next COUNT lots to go long term.')
+    parser.add_argument('-n', '--n_days', type=int,
+                        default=None,
+                        help='Show only the lots that go long term in the next N_DAYS days.')
+    parser.add_argument('-d', '--date',
+                        default=None,
+                        help='Count from this date, YYYY-MM-DD. Default: today.')
+    return parser
+
+
+class LongTermCalendar(object):
+    """
+    A heap of the open short term lots, keyed by the date they become
+    long term. Building it is O(lots). The next lot is popped in
+    O(log lots), so the first few never need the whole list sorted.
+    """
+    def __init__(self, trades, as_of):
+        """
+        trades - trade_confirmation rows, with trade_date a datetime.
+        """
+        matcher = LotMatcher()
+        matcher.match([trade for trade in trades
+                       if trade['trade_type'] in CAPITAL_ASSETS and trade['trade_date'] <= as_of])
+        self.heap = []
+        for open_lots in matcher.open_lots.values():
+            for lot in open_lots:
+                eligible = long_term_date(lot.trade['trade_date'])
+                if eligible > as_of:
+                    # (date, id) is unique, so the lots are never compared.
+                    self.heap.append((eligible, lot.trade['id'], lot))
+        heapq.heapify(self.heap)
+
+
+    def __len__(self):
+        return len(self.heap)
+
+
+    def next_lots(self, count):
+        """
+        Pop the next count lots to go long term. Returns (date, lot) tuples.
+        """
+        lots = []
+        while self.heap and len(lots) < count:
+            (eligible, _, lot) = heapq.heappop(self.heap)
+            lots.append((eligible, lot))
+        return lots
+
+
+    def lots_until(self, date):
+        """
+        Pop the lots that go long term on or before date.
+        Returns (date, lot) tuples.
+        """
+        lots = []
+        while self.heap and self.heap[0][0] <= date:
+            (eligible, _, lot) = heapq.heappop(self.heap)
+            lots.append((eligible, lot))
+        return lots
+
+
+class App(object):
+    def __init__(self, args):
+        self.args = args
+        if args.date:
+            self.as_of = datetime.strptime(args.date, '%Y-%m-%d')
+        else:
+            now = datetime.now()
+            self.as_of = datetime(now.year, now.month, now.day)
+        self.accounts = Account()
+        trades = database.fetch_all('trade_confirmation')
+        for trade in trades:
+            trade['trade_date'] = database.fix_date(trade['trade_date'])
+        self.calendar = LongTermCalendar(trades, self.as_of)
+        self.prices = TradeHistory(fetch_rows=False).latest_prices()
+
+
+    def report(self):
+        if self.args.n_days is not None:
+            lots = self.calendar.lots_until(self.as_of + timedelta(days=self.args.n_days))
+            if self.args.count is not None:
+                lots = lots[:self.args.count]
+        else:
+            lots = self.calendar.next_lots(self.args.count if self.args.count is not None
+                                           else len(self.calendar))
+        print('%-10s %-10s %-12s %10s %-10s %12s' % ('long term', 'symbol', 'account',
+                                                     'shares', 'bought', 'unrealized'))
+        for (eligible, lot) in lots:
+            trade = lot.trade
+            price = self.prices.get((trade['symbol'], trade['account']))
+            if price is None:
+                gain = ''
+            else:
+                gain = '%12.2f' % ((price - lot.unit_cost) * lot.n_shares,)
+            print('%-10s %-10s %-12s %10g %-10s %12s'
+                  % (eligible.strftime('%Y-%m-%d'), trade['symbol'],
+                     self.accounts.account_name_lookup(trade['account']) or trade['account'],
+                     lot.n_shares, trade['trade_date'].strftime('%Y-%m-%d'), gain))
+
+
+def action(args):
+    """
+    List the lots that will go long term.
+    """
+    App(args).report()
+
+
+if __name__ == '__main__':
+    action(build_parser().parse_args())
@@ -0,0 +1,58 @@
+"""
+Look up securities by (part of) a name or symbol, with fuzzy matching,
+or match the names and symbols that aren't in the trade confirmations
+to the ones that are.
+
+Example: python -m app.commands.names "apple" MSFT
+         python -m app.commands.names -r
+"""
+
+from app.db.security_name import SecurityName
+from app.names import MIN_SCORE
+
+import argparse
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description = globals()['__doc__'],
+                                     formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.usage = 'python -m app.commands.names [options] [TEXT ...]'
+    parser.add_argument('text', nargs='*',
+                        help='Names or symbols to look up.')
+    parser.add_argument('-n', '--n_matches', type=int,
+                        default=5,
+                        help='Number of matches to show. '
+                        'Default: %(default)s.')
+    parser.add_argument('-m', '--min_score', type=float,
+                        default=MIN_SCORE,
+                        help='Lowest similarity (0 to 1) that matches. '
+                        'Default: %(default)s.')
+    parser.add_argument('-r', '--reconcile', default=False,
+                        action='store_true',
+                        help='Match the symbols and names of activity and trade history '
+                        'that are not in the trade confirmations. '
+                        'Default: %(default)s.')
+    return parser
+
+
+def action(args):
+    """
+    Print the matches.
+    """
+    index = SecurityName().index()
+    for text in args.text:
+        print(text)
+        matches = index.search(text, limit=args.n_matches, min_score=args.min_score)
+        if not matches:
+            print('  no match')
+        for match in matches:
+            print('  %-10s %5.2f  %s' % (match.symbol, match.score, match.name))
+    if args.reconcile:
+        for rec in index.reconcile(args.min_score):
+            print('%-18s %-10s %-30s -> %-10s %5.2f  %s'
+                  % (rec.table_name, rec.symbol or '', rec.name or '',
+                     rec.match_symbol or '?', rec.score, rec.match_name or ''))
+
+
+if __name__ == '__main__':
+    action(build_parser().parse_args())
@@ -4,13 +4,16 @@ Render the stock charts for one or more stocks.
 
 from app.db.trade_confirmation import TradeConfirmation
 from app.db.trade_history import TradeHistory
+from app.db.security_name import SecurityName
 from app.db.account import Account
 from app.db import database
-from app.pdf_chart import render_chart
+from app.lazy import lazy_import
+from app.profiling import add_arguments as add_profile_arguments, profiler
+from app.svg_chart import render_svg_chart, write_html
+from app.time_axis import series
 
 import argparse
 from datetime import datetime, timedelta
-import calendar
 import logging
 import os
 import os.path
@@ -20,6 +23,9 @@ import re
 
 log = logging.getLogger(__name__)
 
+# Only the PDF charts need reportlab.
+pdf_chart = lazy_import('app.pdf_chart')
+
 db_file = 'investments.db'
 
 
@@ -34,6 +40,22 @@ def build_parser():
                         default='charts',
                         help='Directory to write the chart PDFs. '
                         'Default: %(default)s.')
+    parser.add_argument('-m', '--max_points', type=int,
+                        default=0,
+                        help='Downsample each graph to at most this many points. '
+                        '0 means use all points. '
+                        'Default: %(default)s.')
+    parser.add_argument('-f', '--format', choices=('pdf', 'html'),
+                        default='pdf',
+                        help='pdf writes one PDF file per stock. html writes '
+                        'all of the charts to charts.html as SVG, which is much faster. '
+                        'Default: %(default)s.')
+    parser.add_argument('-l', '--date_labels', default=False,
+                        action='store_true',
+                        help='Label the time axis with month and year '
+                        'instead of fractional years. '
+                        'Default: %(default)s.')
+    add_profile_arguments(parser)
     return parser
 
 
@@ -48,9 +70,18 @@ class RenderChart(object):
         else:
             self.accounts = Account()
         self.trade_histories = database.databases['trade_history']
+        # Convert the dates once, as fetch does, so the rows compare the
+        # same on every call. Commentary rows have no price history.
+        self.has_history = set()
+        for trade_hist in self.trade_histories.rows:
+            trade_hist['history_date'] = database.fix_date(trade_hist['history_date'])
+            if trade_hist['symbol'][0] != '#':
+                self.has_history.add((trade_hist['account'], trade_hist['symbol']))
         # The current stock have this history_date
         self.last_history_date = max([trade_hist['history_date']
                                       for trade_hist in self.trade_histories.rows])
+        # The NameIndex, for stocks without trade confirmations. Built when first needed.
+        self.names = None
 
     def report(self):
         """
@@ -58,52 +89,97 @@ class RenderChart(object):
         If args.out_dir is none, collect the charts to render by the caller.
         """
         charts = []
-        for (account, symbol) in self.get_open_stocks():
-            if self.args.stocks:
-                if symbol in self.args.stocks:
-                    th = self.trade_histories.fetch(account, symbol)
-                else:
-                    th = None
-            else:
-                th = self.trade_histories.fetch(account, symbol)
-            if th:
-                data1 = []
-                data2 = []
-                for h in th:
-                    # Convert date to a float yyyy.yearFraction.
-                    hd = h['history_date']
-                    # Create a datetime, with the year and month from
-                    # hd, and the end of month day (from
-                    # calendar.monthrange).  With timetuple one can
-                    # get the day of the year, and the convert to a
-                    # fraction.  Use 366 to account for leap years
-                    # that have that many days.
-                    frac = ((datetime(hd.year, hd.month, calendar.monthrange(hd.year, hd.month)[1])).timetuple().tm_yday - 1) / 366.0
-                    data1.append((hd.year + frac, h['current_price']))
-                    data2.append((hd.year + frac, h['unit_cost']))
-                #print('\n'.join(sorted(['%d/%2d, %8.2f' % (int(x), (x % 1) * 12 + 1,y) for (x,y) in data1])))
-
-
-                if self.args.out_dir:
-                    filename = os.path.join(self.args.out_dir, '%s.pdf' % (symbol.replace('/', '-')))
-                else:
-                    filename = None
-                sym_details = self.tc.fetch(symbol)
-                if len(sym_details):
-                    name = sym_details[0]['name']
-                else:
-                    name = ''
-                    print(f'Unknown ticker "{symbol}"')
-                chart = render_chart(filename,
-                                     '%s %s %s' % (name, 
-                                                   f'({symbol})',
-                                                   self.accounts.account_name_lookup(h['account'])),
-                                     [data1, data2], ('price', 'cost'))
-                if not filename:
-                    charts.append(chart)
+        for chart in self.iter_charts():
+            if not self.args.out_dir:
+                charts.append(chart)
         return charts
 
 
+    def iter_charts(self):
+        """
+        Generate the charts one at a time, so the caller can release
+        each one before the next is built.
+        """
+        for (account, symbol) in self.chart_keys():
+            yield self.render(account, symbol)
+
+
+    def chart_keys(self):
+        """
+        Get the (account, symbol) tuples of the charts to render.
+        Every open stock has a trade history, at least for the last
+        history date. Skip the ones with nothing to graph.
+        """
+        return [(account, symbol) for (account, symbol) in self.get_open_stocks()
+                if (not self.args.stocks or symbol in self.args.stocks)
+                and (account, symbol) in self.has_history]
+
+
+    def chart_data(self, account, symbol):
+        """
+        Get the caption and the (x,y) points of the price and cost graphs
+        for one stock in an account.
+        """
+        with profiler.phase('fetch'):
+            th = self.trade_histories.fetch(account, symbol)
+        # Convert dates to a float yyyy.yearFraction.
+        data1 = series(th, 'history_date', 'current_price')
+        data2 = series(th, 'history_date', 'unit_cost')
+        #print('\n'.join(sorted(['%d/%2d, %8.2f' % (int(x), (x % 1) * 12 + 1,y) for (x,y) in data1])))
+
+        sym_details = self.tc.fetch(symbol)
+        if len(sym_details):
+            name = sym_details[0]['name']
+        else:
+            # No trades under this symbol (it may have changed): use the
+            # name it has elsewhere.
+            if self.names is None:
+                self.names = SecurityName().index()
+            name = self.names.name_of(symbol) or ''
+            if not name:
+                print(f'Unknown ticker "{symbol}"')
+        caption_text = '%s %s %s' % (name,
+                                     f'({symbol})',
+                                     self.accounts.account_name_lookup(account))
+        return (caption_text, [data1, data2])
+
+
+    def render(self, account, symbol):
+        """
+        Render the PDF chart for one stock in an account.
+        """
+        if self.args.out_dir:
+            filename = os.path.join(self.args.out_dir, '%s.pdf' % (symbol.replace('/', '-')))
+        else:
+            filename = None
+        (caption_text, data) = self.chart_data(account, symbol)
+        with profiler.phase('chart build'):
+            return pdf_chart.render_chart(filename, caption_text, data, ('price', 'cost'),
+                                          max_points=self.args.max_points,
+                                          date_labels=self.args.date_labels)
+
+
+    def render_svg(self, account, symbol):
+        """
+        Render the SVG chart for one stock in an account.
+        """
+        (caption_text, data) = self.chart_data(account, symbol)
+        with profiler.phase('svg chart build'):
+            return render_svg_chart(caption_text, data, ('price', 'cost'),
+                                    max_points=self.args.max_points,
+                                    date_labels=self.args.date_labels)
+
+
+    def report_html(self, filename):
+        """
+        Write the charts for all stocks, or the ones specified, to a
+        single HTML file.
+        """
+        write_html(filename, 'Stock Charts',
+                   [self.render_svg(account, symbol)
+                    for (account, symbol) in self.chart_keys()])
+
+
     def get_open_stocks(self):
         """
         Get list of all open stocks. We don't care about the ones
@@ -130,8 +206,13 @@ def action(args):
     """
     Load the parts in the spreadsheet
     """
-    r = RenderChart(args)
-    r.report()
+    with profiler.profile('render_charts', args):
+        with profiler.phase('load'):
+            r = RenderChart(args)
+        if args.format == 'html':
+            r.report_html(os.path.join(args.out_dir, 'charts.html'))
+        else:
+            r.report()
 
     
 if __name__ == '__main__':
@@ -3,27 +3,38 @@ Page layout example using reportlab.
 
 TODO:
 For each graph, draw the gain and loss lines.
-Sort the gain/loss tables on pages 43-44
 """
 
 import argparse
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
-from reportlab.rl_config import defaultPageSize
+import resource
 import time
 from datetime import datetime, timezone, timedelta
-import calendar
 
 from app.db.account import Account
+from app.db.income import Income
 from app.db.performance_review import PerformanceReview
 from app.db.trade_history import TradeHistory
 from app.db import database
-from app.pdf_chart import render_chart
-
-from app.commands.render_charts import RenderChart
+from app.income import trailing
+from app.lazy import lazy_import
+from app.profiling import add_arguments as add_profile_arguments, profiler
+from app.returns import table as returns_table
+from app.commands.returns import load_returns
+from app.svg_chart import render_svg_chart, html_table, write_html
+from app.time_axis import series
+
+# Only the PDF report needs reportlab.
+colors = lazy_import('reportlab.lib.colors')
+pagesizes = lazy_import('reportlab.lib.pagesizes')
+pdfmetrics = lazy_import('reportlab.pdfbase.pdfmetrics')
+pdfgen_canvas = lazy_import('reportlab.pdfgen.canvas')
+platypus = lazy_import('reportlab.platypus')
+rl_config = lazy_import('reportlab.rl_config')
+styles = lazy_import('reportlab.lib.styles')
+units = lazy_import('reportlab.lib.units')
+pdf_chart = lazy_import('app.pdf_chart')
+# Only when the charts are built, in DataItems.
+render_charts = lazy_import('app.commands.render_charts')
 
 def build_parser():
     parser = argparse.ArgumentParser(description = globals()['__doc__'],
@@ -45,6 +56,35 @@ def build_parser():
                         'Use %%p for current page, '
                         '%%P for total pages, %%d for date, %%t for time. '
                         'Default: %(default)s.')
+    parser.add_argument('-m', '--max_points', type=int,
+                        default=0,
+                        help='Downsample each graph to at most this many points. '
+                        '0 means use all points. '
+                        'Default: %(default)s.')
+    parser.add_argument('-l', '--date_labels', default=False,
+                        action='store_true',
+                        help='Label the time axis with month and year '
+                        'instead of fractional years. '
+                        'Default: %(default)s.')
+    parser.add_argument('--sort', choices=('none', 'loss', 'gain'),
+                        default='none',
+                        help='Order of the positions in the loss/gain tables: '
+                        'none (as loaded), loss (biggest loss first) or '
+                        'gain (biggest gain first). '
+                        'Default: %(default)s.')
+    parser.add_argument('--format', choices=('pdf', 'html'),
+                        default='pdf',
+                        help='pdf is for printing. html is a quick look in a browser, '
+                        'with SVG charts, and is much faster to generate. '
+                        'A .pdf out_file becomes .html. '
+                        'Default: %(default)s.')
+    parser.add_argument('-s', '--stream', default=False,
+                        action='store_true',
+                        help='Build each stock chart as its page is laid out and '
+                        'release it afterwards, instead of building all of them first. '
+                        'Keeps memory use flat for large reports. '
+                        'Default: %(default)s.')
+    add_profile_arguments(parser)
     return parser
 
 
@@ -52,7 +92,7 @@ class DataItems():
     """
     Container for the data we need.
     """
-    def __init__(self):
+    def __init__(self, args):
         # Account data
         self.account_titles = ['Name', 'Number']
         ac = Account()
@@ -74,12 +114,10 @@ class DataItems():
         # and the value is a row.
         all = dict()
         for ac_row in ac.rows:
-            d = []
-            all[ac_row['number']] = d
-            for th_row in th.rows:
-                if ac_row['number'] == th_row['account'] and \
-                   th_row['history_date'] == max_date:
-                    d.append(th_row)
+            all[ac_row['number']] = []
+        for th_row in th.rows:
+            if th_row['history_date'] == max_date and th_row['account'] in all:
+                all[th_row['account']].append(th_row)
         # Now we can render the lines.
         self.trailer_data = []
         for number in all.keys():
@@ -89,7 +127,12 @@ class DataItems():
                      column_headers=['Symbol', 'Quantity', 'Unit Cost',
                                      'Current Price', '-15%', '+30%'],
                      data = d))
-            for th in all[number]:
+            rows = all[number]
+            if args.sort != 'none':
+                rows = sorted(rows,
+                              key=lambda th: (th['current_price'] - th['unit_cost']) * th['n_shares'],
+                              reverse=args.sort == 'gain')
+            for th in rows:
                 d.append([th['symbol'], th['n_shares'],
                           th['unit_cost'], th['current_price'],
                           '%3.2f' % (th['unit_cost'] * .85,),
@@ -100,37 +143,64 @@ class DataItems():
         self.performance_reviews_market = dict()
         pr = PerformanceReview()
         for (number, name) in self.accounts:
-            self.performance_reviews_market[number] = []
-            for row in pr.rows:
-                if row['account'] == number:
-                    # Convert date to a float yyyy.yearFraction.
-                    ed = row['end_date']
-                    # Create a datetime, with the year and month from
-                    # ed, and the end of month day (from
-                    # calendar.monthrange).  With timetuple one can
-                    # get the day of the year, and the convert to a
-                    # fraction.  Use 366 to account for leap years
-                    # that have that many days.
-                    frac = ((datetime(ed.year, ed.month, calendar.monthrange(ed.year, ed.month)[1])).timetuple().tm_yday - 1) / 366.0
-                    self.performance_reviews_market[number].append(
-                        (row['end_date'].year + frac,
-                        row['end_market_value']))
+            # Convert dates to a float yyyy.yearFraction.
+            self.performance_reviews_market[number] = series(
+                [row for row in pr.rows if row['account'] == number],
+                'end_date', 'end_market_value')
+
+        # Income over the 12 months up to the latest trade history, and the 12 before.
+        with profiler.phase('income'):
+            self.income_titles = ['Account', 'Income', 'Previous 12 months', 'Change']
+            self.income = []
+            if max_date:
+                index = Income().index()
+                last = database.fix_date(max_date)
+                (start, end) = trailing(last)
+                (previous_start, _) = trailing(last, 24)
+                self.income_titles[1] = '%s to %s' % (start, last.strftime('%Y-%m-%d'))
+                for (number, name) in self.accounts:
+                    income = index.total(number, None, start, end)
+                    previous = index.total(number, None, previous_start, start)
+                    self.income.append([name, '%.2f' % (income,), '%.2f' % (previous,),
+                                        '%+.1f%%' % ((income / previous - 1) * 100,) if previous else ''])
+
+        # Returns of each account and the portfolio.
+        with profiler.phase('returns'):
+            (self.returns_titles, self.returns) = returns_table(load_returns(),
+                                                                self.account_number_to_name)
 
         # Trade history
         class Args():
             def __init__(self):
                 self.stocks = []
                 self.out_dir = None
-        self.charts = RenderChart(Args()).report()
+                self.max_points = args.max_points
+                self.date_labels = args.date_labels
+        self.render_chart = render_charts.RenderChart(Args())
+        if args.stream or args.format == 'html':
+            # Charts are built by LazyChart during doc.build, or as SVG.
+            self.charts = None
+        else:
+            with profiler.phase('charts'):
+                self.charts = self.render_chart.report()
+
+
+def peak_rss_mb():
+    """
+    Return the peak resident set size of this process in megabytes.
+    """
+    # ru_maxrss is in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
 
 
 class Pages():
-    def __init__(self, args, n_pages):
-        self.PAGE_HEIGHT=defaultPageSize[1]
-        self.PAGE_WIDTH=defaultPageSize[0]
+    def __init__(self, args):
+        self.PAGE_HEIGHT=rl_config.defaultPageSize[1]
+        self.PAGE_WIDTH=rl_config.defaultPageSize[0]
         self.title = args.title
         self.footer_title = args.footer_title
-        self.n_pages = n_pages
+        # Known once the document is built. See canvasmaker.
+        self.n_pages = None
         timezone_offset = -8.0  # Pacific Standard Time
         tzinfo = timezone(timedelta(hours=timezone_offset))
         self.now = datetime.now(tzinfo)
@@ -153,9 +223,10 @@ class Pages():
         return footer
 
 
-    def render_footer(self, canvas, doc):
+    def render_footer(self, canvas, page):
         canvas.setFont('Times-Roman',9)
-        (inside, center, outside) = self.parse_footer(doc.page)
+        (inside, center, outside) = self.parse_footer(page)
+        inch = units.inch
         canvas.drawString(inch, 0.75 * inch, inside)
         canvas.drawCentredString(self.PAGE_WIDTH/2.0, 0.75 * inch, center)
         canvas.drawRightString(self.PAGE_WIDTH - inch, 0.75 * inch, outside)
@@ -168,32 +239,56 @@ class Pages():
         for title in self.title.split('|'):
             canvas.drawCentredString(self.PAGE_WIDTH/2.0, y, title)
             y -= 16
-        self.render_footer(canvas, doc)
         canvas.restoreState()
 
 
-    def later_pages(self, canvas, doc):
-        canvas.saveState()
-        self.render_footer(canvas, doc)
-        canvas.restoreState()
+    def canvasmaker(self):
+        """
+        Return a canvas class that holds back each page until the
+        document is done, then draws the footers, so %P is the number of
+        pages actually built (long tables split over as many as needed).
+        """
+        pages = self
+
+        class FooterCanvas(pdfgen_canvas.Canvas):
+            def __init__(self, *args, **kwargs):
+                pdfgen_canvas.Canvas.__init__(self, *args, **kwargs)
+                self.page_states = []
+
+            def showPage(self):
+                self.page_states.append(dict(self.__dict__))
+                self._startPage()
+
+            def save(self):
+                pages.n_pages = len(self.page_states)
+                for state in self.page_states:
+                    self.__dict__.update(state)
+                    self.saveState()
+                    pages.render_footer(self, self.getPageNumber())
+                    self.restoreState()
+                    pdfgen_canvas.Canvas.showPage(self)
+                pdfgen_canvas.Canvas.save(self)
+
+        return FooterCanvas
 
 
 class Action():
     def __init__(self, args):
         self.args = args
-        self.data_items = DataItems()
+        with profiler.phase('DataItems'):
+            self.data_items = DataItems(args)
         
     def render_investments(self):
         # Investment type table.
         account_data = self.data_items.accounts
-        t=Table([self.data_items.account_titles] + account_data)
-        t.setStyle(TableStyle([('TEXTCOLOR',     (0,0), (-1,0),colors.green),
-                               ('FONT',          (0,0), (-1,0), 'Helvetica-Bold'),
-                               ('FONTSIZE',      (0,0), (-1,0), 14),
-                               ('TOPPADDING',    (0,0), (-1,0), 1),
-                               ('BOTTOMPADDING', (0,0), (-1,0), 5),
-                               ('INNERGRID',     (0,0), (-1,-1), 1.0, colors.black),
-                               ('BOX',           (0,0), (-1,-1), 1.0, colors.black),]))
+        t=platypus.Table([self.data_items.account_titles] + account_data)
+        t.setStyle(platypus.TableStyle([('TEXTCOLOR',     (0,0), (-1,0),colors.green),
+                                        ('FONT',          (0,0), (-1,0), 'Helvetica-Bold'),
+                                        ('FONTSIZE',      (0,0), (-1,0), 14),
+                                        ('TOPPADDING',    (0,0), (-1,0), 1),
+                                        ('BOTTOMPADDING', (0,0), (-1,0), 5),
+                                        ('INNERGRID',     (0,0), (-1,-1), 1.0, colors.black),
+                                        ('BOX',           (0,0), (-1,-1), 1.0, colors.black),]))
         return t
 
 
@@ -201,60 +296,143 @@ class Action():
         perf_data = self.data_items.performance_reviews_market
         accounts = sorted(perf_data.keys())
         data = [perf_data[account] for account in accounts]
-        drawing = render_chart(None, 'Performance Graphs',
-                               data,
-                               accounts,
-                               width=500,
-                               graph_width=500-100,
-                               graph_y=0)
+        drawing = pdf_chart.render_chart(None, 'Performance Graphs',
+                                         data,
+                                         accounts,
+                                         width=500,
+                                         graph_width=500-100,
+                                         graph_y=0,
+                                         max_points=self.args.max_points,
+                                         date_labels=self.args.date_labels)
         return drawing
 
 
+    def render_returns(self):
+        t = platypus.Table([self.data_items.returns_titles] + self.data_items.returns)
+        t.setStyle(platypus.TableStyle([('FONT',          (0,0), (-1,0), 'Helvetica-Bold'),
+                                        ('FONTSIZE',      (0,0), (-1,-1), 8),
+                                        ('ALIGN',         (1,0), (-1,-1), 'RIGHT'),
+                                        ('INNERGRID',     (0,0), (-1,-1), 0.5, colors.black),
+                                        ('BOX',           (0,0), (-1,-1), 1.0, colors.black),]))
+        return t
+
+
+    def render_income(self):
+        t = platypus.Table([self.data_items.income_titles] + self.data_items.income)
+        t.setStyle(platypus.TableStyle([('FONT',          (0,0), (-1,0), 'Helvetica-Bold'),
+                                        ('FONTSIZE',      (0,0), (-1,-1), 8),
+                                        ('ALIGN',         (1,0), (-1,-1), 'RIGHT'),
+                                        ('INNERGRID',     (0,0), (-1,-1), 0.5, colors.black),
+                                        ('BOX',           (0,0), (-1,-1), 1.0, colors.black),]))
+        return t
+
+
     def render_charts(self):
-        return self.data_items.charts
+        if self.args.stream:
+            return [pdf_chart.LazyChart(self.data_items.render_chart, account, symbol)
+                    for (account, symbol) in self.data_items.render_chart.chart_keys()]
+        return [pdf_chart.landscape(chart) for chart in self.data_items.charts]
 
     def render(self):
         charts = self.render_charts()
-        n_charts = len(charts)
-        n_pages = 1 + n_charts + 2
-        pages = Pages(self.args, n_pages)
-        doc = SimpleDocTemplate(self.args.out_file, pagesize=letter)
-        self.styles = getSampleStyleSheet()
+        pages = Pages(self.args)
+        doc = platypus.SimpleDocTemplate(self.args.out_file, pagesize=pagesizes.letter)
+        self.styles = styles.getSampleStyleSheet()
 
-        elements = [Spacer(1, inch)]  # Start off with a spacer 1" high
+        elements = [platypus.Spacer(1, units.inch)]  # Start off with a spacer 1" high
 
         elements.append(self.render_investments())
        
         elements.append(self.render_performance())
 
-        elements.append(PageBreak())
+        elements.append(platypus.PageBreak())
+
+        # Returns and income on their own page.
+        elements.append(self.render_returns())
+        elements.append(platypus.Spacer(1, units.inch / 4))
+        elements.append(self.render_income())
+
+        elements.append(platypus.PageBreak())
 
-        # Rotate the charts (graphs) so they are in landscape orientation.
-        # Translate (x,y) to specify a new origin in lower right part of the page.
-        [(chart.rotate(90),chart.translate(-4 * inch, -5.0 * inch)) for chart in charts]
         elements += charts
         elements += self.render_loss_gain_chart()
-        doc.build(elements, onFirstPage=pages.first_page, onLaterPages=pages.later_pages)
+        with profiler.phase('doc.build'):
+            doc.build(elements, onFirstPage=pages.first_page, canvasmaker=pages.canvasmaker())
+        if self.args.stream or self.args.profile or self.args.memory:
+            print('peak RSS: %.1f MB' % (peak_rss_mb(),))
+
+
+    def render_html(self):
+        """
+        Render the same report as a single HTML file with SVG charts.
+        """
+        out_file = self.args.out_file
+        if out_file.endswith('.pdf'):
+            out_file = out_file[:-len('.pdf')] + '.html'
+        perf_data = self.data_items.performance_reviews_market
+        accounts = sorted(perf_data.keys())
+        sections = [html_table(self.data_items.account_titles, self.data_items.accounts)]
+        sections.append(render_svg_chart('Performance Graphs',
+                                          [perf_data[account] for account in accounts],
+                                          accounts,
+                                          max_points=self.args.max_points,
+                                          date_labels=self.args.date_labels))
+        sections.append(html_table(self.data_items.returns_titles, self.data_items.returns,
+                                   'Returns'))
+        sections.append(html_table(self.data_items.income_titles, self.data_items.income,
+                                   'Income'))
+        render_chart = self.data_items.render_chart
+        for (account, symbol) in render_chart.chart_keys():
+            sections.append(render_chart.render_svg(account, symbol))
+        for td in self.data_items.trailer_data:
+            sections.append(html_table(td['column_headers'], td['data'], td['title']))
+        with profiler.phase('write_html'):
+            write_html(out_file, self.args.title.replace('|', ' '), sections)
+
+
+    def column_widths(self, td, font_size=8):
+        """
+        Calculate the column widths of a loss/gain table once, from the
+        widest value in each column, so the table doesn't need to.
+        """
+        padding = 12              # LEFTPADDING + RIGHTPADDING
+        stringWidth = pdfmetrics.stringWidth
+        widths = [stringWidth(str(header), 'Helvetica-Bold', font_size)
+                  for header in td['column_headers']]
+        for row in td['data']:
+            for (col, value) in enumerate(row):
+                width = stringWidth(str(value), 'Helvetica', font_size)
+                if width > widths[col]:
+                    widths[col] = width
+        return [width + padding for width in widths]
 
 
     def render_loss_gain_chart(self):
-        elements = [PageBreak()]
+        """
+        Render a table of the current positions for each account. The
+        tables are LongTables so large accounts split across pages, with
+        the column headers repeated on each page.
+        """
+        elements = [platypus.PageBreak()]
         first = True
         for td in self.data_items.trailer_data:
             if first:
                 first = False
             else:
-                elements.append(Paragraph(
+                elements.append(platypus.Paragraph(
                     '<font name="Helvetica">%s</font>' % ('&nbsp;',),
                     self.styles["Normal"]))
-            elements.append(Paragraph(
+            elements.append(platypus.Paragraph(
                 '<font name="Helvetica">%s</font>' % (td['title'],),
                 self.styles["Normal"]))
-            elements.append(Paragraph(
+            elements.append(platypus.Paragraph(
                 '<font name="Helvetica">%s</font>' % ('&nbsp;',),
                 self.styles["Normal"]))
-            elements.append(Table([td['column_headers']] + td['data'],
-                                  rowHeights=[.228 * inch] * (len(td['data']) + 1),
+            elements.append(platypus.LongTable([td['column_headers']] + td['data'],
+                                  colWidths=self.column_widths(td),
+                                  rowHeights=[.228 * units.inch] * (len(td['data']) + 1),
+                                  repeatRows=1,
+                                  splitByRow=1,
                                   style = [
                                       ('INNERGRID', (0,0), (-1,-1), 0.25, colors.black),
                                       ('BOX', (0,0), (-1,-1), 0.25, colors.black),
@@ -265,5 +443,16 @@ class Action():
 
 
     
+def action(args):
+    """
+    Render the report.
+    """
+    with profiler.profile('report', args):
+        if args.format == 'html':
+            Action(args).render_html()
+        else:
+            Action(args).render()
+
+
 if __name__ == '__main__':
-    Action(build_parser().parse_args()).render()
+    action(build_parser().parse_args())
@@ -0,0 +1,52 @@
+"""
+Show the time-weighted return, XIRR and rolling 1, 3 and 5 year returns
+of each account and of the whole portfolio, from the performance reviews
+and the cash moved into and out of the accounts.
+
+Example: python -m app.commands.returns
+"""
+
+from app.db.account import Account
+from app.db.activity import Activity
+from app.db.performance_review import PerformanceReview
+from app.returns import EXTERNAL_FLOWS, account_returns, table
+
+import argparse
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description = globals()['__doc__'],
+                                     formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.usage = 'python -m app.commands.returns [options]'
+    parser.add_argument('-c', '--csv', default=False,
+                        action='store_true',
+                        help='Output CSV instead of a table. '
+                        'Default: %(default)s.')
+    return parser
+
+
+def load_returns():
+    """
+    Return the Returns of each account and of the portfolio.
+    """
+    flows = Activity(fetch_rows=False).flows(EXTERNAL_FLOWS)
+    return account_returns(PerformanceReview().rows, flows)
+
+
+def action(args):
+    """
+    Print the returns.
+    """
+    (headers, rows) = table(load_returns(), Account().names)
+    if args.csv:
+        for row in [headers] + rows:
+            print(','.join(row))
+        return
+    widths = [max([len(str(row[col])) for row in [headers] + rows]) for col in range(len(headers))]
+    for row in [headers] + rows:
+        print('  '.join([str(value).ljust(width) if col == 0 else str(value).rjust(width)
+                         for (col, (value, width)) in enumerate(zip(row, widths))]))
+
+
+if __name__ == '__main__':
+    action(build_parser().parse_args())
@@ -6,16 +6,27 @@ Load data from the spreadsheet to the database.
 import argparse
 from datetime import datetime, timedelta
 import glob
+from itertools import groupby
 import logging
 import os
 import subprocess
 import sqlite3
-from openpyxl import load_workbook
 import re
 
+from app.lazy import lazy_import
+from app import load_changes
+from app.holdings import SHARE_ACTIVITY
+from app.income import INCOME_TYPES, running_sums
+from app.names import NOT_SECURITIES, normalize
+from app.lots import CAPITAL_ASSETS, LotMatcher, held_days, is_long_term
+from app.profiling import add_arguments as add_profile_arguments, profiler
+from app.wash_sales import WashSales
+
 
 log = logging.getLogger(__name__)
 
+openpyxl = lazy_import('openpyxl')
+
 
 def build_parser():
     parser = argparse.ArgumentParser(description = globals()['__doc__'],
@@ -30,6 +41,22 @@ def build_parser():
                         default='investments.db',
                         help='Sqlite database filename. '
                         'Default: %(default)s.')
+    parser.add_argument('-m',
+                        '--method',
+                        choices=('fifo', 'lifo', 'hifo'),
+                        default='fifo',
+                        help='Which lots are sold first when computing the realized gains: '
+                        'first in, last in, or highest cost. '
+                        'Default: %(default)s.')
+    parser.add_argument('-c',
+                        '--compact',
+                        default=False,
+                        action='store_true',
+                        help='Store the trade history compactly: each position once, '
+                        'and only the price on each history date. trade_history '
+                        'becomes a view with the same columns. '
+                        'Default: %(default)s.')
+    add_profile_arguments(parser)
     return parser
 
 
@@ -43,8 +70,18 @@ class App(object):
     def __init__(self, args):
         self.args = args
         self.db_open()
-        self.db_init()
-        self.wb = load_workbook(filename = self.args.in_file)
+        with profiler.phase('read previous load'):
+            # The tables of the previous load, for load_changes.
+            self.previous = load_changes.read_snapshot(self.cur)
+        with profiler.phase('db_init'):
+            self.db_init()
+        with profiler.phase('open workbook'):
+            self.wb = openpyxl.load_workbook(filename = self.args.in_file)
+        # The loaded trade confirmations, for matching lots.
+        self.trade_confirmations = []
+        # For --compact, key is (account, symbol), value is
+        # (position id, n_shares, unit_cost, name) of its latest position.
+        self.positions = dict()
 
 
     def db_open(self):
@@ -67,6 +104,10 @@ class App(object):
         self.init_trade_confirmation()
         self.init_activity()
         self.init_trade_history()
+        self.init_realized_gain()
+        self.init_income()
+        self.init_security_name()
+        self.init_load_changes()
 
 
     def eval(self, ws, in_expr):
@@ -85,8 +126,10 @@ class App(object):
         self.cur.execute(sql)
         sql = """CREATE TABLE IF NOT EXISTS account(
   number text,
-  name text
+  name text,
+  taxable integer
 )"""
+        # taxable - 1 unless it is an IRA
         self.cur.execute(sql)
 
 
@@ -144,11 +187,20 @@ class App(object):
 """
         # activity_type - dividend, purchase, sale, interest, fee, bought
         self.cur.execute(sql)
+        sql = 'CREATE INDEX activity_type_date ON activity(activity_type, activity_date)'
+        self.cur.execute(sql)
 
 
     def init_trade_history(self):
-        sql = 'DROP TABLE IF EXISTS trade_history'
-        self.cur.execute(sql)
+        # Either a table, or with --compact a view of position and price_history.
+        self.cur.execute("SELECT type FROM sqlite_master WHERE name = 'trade_history'")
+        for (object_type,) in self.cur.fetchall():
+            self.cur.execute('DROP %s trade_history' % (object_type.upper(),))
+        self.cur.execute('DROP TABLE IF EXISTS price_history')
+        self.cur.execute('DROP TABLE IF EXISTS position')
+        if self.args.compact:
+            self.init_compact_trade_history()
+            return
         sql = """CREATE TABLE IF NOT EXISTS trade_history(
   id integer PRIMARY KEY AUTOINCREMENT,
   account text,
@@ -162,6 +214,133 @@ class App(object):
         self.cur.execute(sql)
 
 
+    def init_compact_trade_history(self):
+        sql = """CREATE TABLE position(
+  id integer PRIMARY KEY AUTOINCREMENT,
+  account text,
+  symbol text,
+  n_shares integer,
+  unit_cost real,
+  name text)
+"""
+        # A new position row is only added when n_shares, unit_cost or
+        # name change from one history date to the next.
+        self.cur.execute(sql)
+        sql = """CREATE TABLE price_history(
+  id integer PRIMARY KEY AUTOINCREMENT,
+  position_id integer,
+  history_date text,
+  current_price real)
+"""
+        self.cur.execute(sql)
+        # The same columns, and rows in the same order, as the trade_history table.
+        sql = """CREATE VIEW trade_history AS
+SELECT ph.id AS id, p.account AS account, ph.history_date AS history_date, p.symbol AS symbol,
+  p.n_shares AS n_shares, p.unit_cost AS unit_cost, ph.current_price AS current_price, p.name AS name
+FROM price_history ph INNER JOIN position p ON p.id = ph.position_id
+ORDER BY ph.id
+"""
+        self.cur.execute(sql)
+
+
+    def init_realized_gain(self):
+        sql = 'DROP TABLE IF EXISTS realized_gain'
+        self.cur.execute(sql)
+        sql = """CREATE TABLE IF NOT EXISTS realized_gain(
+  id integer PRIMARY KEY AUTOINCREMENT,
+  sell_id integer,
+  buy_id integer,
+  account text,
+  symbol text,
+  name text,
+  acquired_date text,
+  sold_date text,
+  sale_year integer,
+  n_shares integer,
+  cost real,
+  proceeds real,
+  gain real,
+  held_days integer,
+  is_long_term integer,
+  adjustment_code text,
+  adjustment real DEFAULT 0.0)
+"""
+        # One row for each part of a sell that closes (part of) a buy.
+        # buy_id, acquired_date and held_days are NULL if no purchase was found.
+        # adjustment_code, adjustment - Form 8949 columns (f) and (g): W and
+        #   the disallowed loss for a wash sale.
+        # gain - proceeds - cost + adjustment, Form 8949 column (h).
+        self.cur.execute(sql)
+        sql = 'CREATE INDEX realized_gain_year ON realized_gain(sale_year, account)'
+        self.cur.execute(sql)
+
+
+    def init_income(self):
+        sql = 'DROP TABLE IF EXISTS income'
+        self.cur.execute(sql)
+        sql = """CREATE TABLE IF NOT EXISTS income(
+  id integer PRIMARY KEY AUTOINCREMENT,
+  activity_id integer,
+  account text,
+  symbol text,
+  income_date text,
+  activity_type text,
+  amount real,
+  symbol_cumulative real,
+  account_cumulative real)
+"""
+        # One row for each dividend or interest payment, in date order.
+        # symbol - the stock, or the payer's name for interest.
+        # income_date - YYYY-MM-DD.
+        # symbol_cumulative, account_cumulative - running sums of amount,
+        #   for app.income.IncomeIndex.
+        self.cur.execute(sql)
+
+
+    def init_security_name(self):
+        sql = 'DROP TABLE IF EXISTS security_name'
+        self.cur.execute(sql)
+        sql = """CREATE TABLE IF NOT EXISTS security_name(
+  id integer PRIMARY KEY AUTOINCREMENT,
+  table_name text,
+  symbol text,
+  name text,
+  normalized text,
+  n_rows integer)
+"""
+        # One row for each distinct symbol and name in trade_confirmation,
+        # activity and trade_history.
+        # normalized - see app.names.normalize.
+        # n_rows - the number of rows of the table with this symbol and name.
+        self.cur.execute(sql)
+        sql = 'CREATE INDEX security_name_symbol ON security_name(symbol)'
+        self.cur.execute(sql)
+
+
+    def init_load_changes(self):
+        # Not dropped: it keeps the changes of every load.
+        sql = """CREATE TABLE IF NOT EXISTS load_changes(
+  id integer PRIMARY KEY AUTOINCREMENT,
+  load_date text,
+  table_name text,
+  change text,
+  account text,
+  symbol text,
+  item_date text,
+  detail text,
+  n_shares integer,
+  old_value real,
+  new_value real)
+"""
+        # table_name, change - see app.load_changes.
+        # load_date - when s2db was run.
+        # item_date - trade_date, activity_date or history_date of the changed row.
+        # detail - buy or sell for a trade, the activity_type for activity.
+        # old_value, new_value - share_price for a trade, amount for activity,
+        #   n_shares or current_price for a position.
+        self.cur.execute(sql)
+
+
     def load_accounts(self):
         start_row = 3
         first_row = True
@@ -176,10 +355,10 @@ class App(object):
             else:
                 names = [cell.value for cell in row[1:7] if cell.value]
                 break
-        sql = "INSERT INTO account(number, name) values(:number, :name)"
+        sql = "INSERT INTO account(number, name, taxable) values(:number, :name, :taxable)"
         for (number, name) in zip(numbers, names):
             count += 1
-            self.cur.execute(sql, dict(number=number, name=name))
+            self.cur.execute(sql, dict(number=number, name=name, taxable='IRA' not in name))
         print('accounts:', count)
 
 
@@ -263,13 +442,49 @@ VALUES(:trade_date, :is_buy, :n_shares, :share_price, :total, :account,
   :fee, :accrued_interest, :trade_type, :symbol, :name, :expiration_date, :strike_price)
 """
                 self.cur.execute(sql, values)
+                self.trade_confirmations.append(dict(values, id=self.cur.lastrowid))
         print('trade confirmations:', count)
 
 
     def load_account_detail(self):
         for account in ['Individual', 'Roth IRA', 'IRA']:
-            self.load_activity(account)
-            self.load_trade_history(account)
+            with profiler.phase('load_activity'):
+                self.load_activity(account)
+            with profiler.phase('load_trade_history'):
+                self.load_trade_history(account)
+        with profiler.phase('activity_shares'):
+            self.activity_shares()
+
+
+    def activity_shares(self):
+        """
+        Work out the shares bought by the dividend reinvestments whose
+        description doesn't give them: the amount over the price in the
+        trade history on (or else the first after) the activity date.
+        """
+        sql = """UPDATE activity SET n_shares = round(abs(amount) / coalesce(
+    (SELECT th.current_price FROM trade_history th
+     WHERE th.account = activity.account AND th.symbol = activity.symbol
+       AND th.history_date <= activity.activity_date AND th.current_price > 0
+     ORDER BY th.history_date DESC LIMIT 1),
+    (SELECT th.current_price FROM trade_history th
+     WHERE th.account = activity.account AND th.symbol = activity.symbol
+       AND th.current_price > 0
+     ORDER BY th.history_date LIMIT 1)), 4)
+WHERE activity_type = 'dividend reinvestment' AND n_shares IS NULL AND amount IS NOT NULL
+  AND EXISTS (SELECT 1 FROM trade_history th
+              WHERE th.account = activity.account AND th.symbol = activity.symbol
+                AND th.current_price > 0)"""
+        self.cur.execute(sql)
+        if self.cur.rowcount:
+            print('dividend reinvestment shares from prices:', self.cur.rowcount)
+        sql = """SELECT count(*) FROM activity
+WHERE activity_type IN (%s) AND n_shares IS NULL""" % (', '.join(['?'] * len(SHARE_ACTIVITY)),)
+        self.cur.execute(sql, SHARE_ACTIVITY)
+        (missing,) = self.cur.fetchone()
+        if missing:
+            print('Warning: %d stock distributions or reinvestments without shares '
+                  'are left out of the holdings' % (missing,))
 
 
     def load_activity(self, sheet_name):
@@ -324,6 +539,12 @@ VALUES(:trade_date, :is_buy, :n_shares, :share_price, :total, :account,
                             # TODO:
                             # What do I do with the #calls, strike price and expiration date?
                         name = name[:m.start()]
+                if activity_type in SHARE_ACTIVITY:
+                    # The shares may be at the end of what is left: "... 12.5 shares".
+                    m = re.search(r'\s+(\d+(?:\.\d+)?)\s+shares?$', name)
+                    if m:
+                        n_shares = float(m.group(1))
+                        name = name[:m.start()]
                 values = dict(account = account,
                               activity_date = activity_date,
                               amount = amount,
@@ -371,6 +592,9 @@ VALUES(:account, :activity_date, :amount, :name, :symbol, :n_shares, :activity_t
                     values['history_date'] = history_date
                 values['account'] = account
                 count += 1
+                if self.args.compact:
+                    self.insert_price_history(values)
+                    continue
                 sql = """INSERT INTO trade_history (account, history_date, symbol, n_shares, unit_cost, current_price, name)
 VALUES(:account, :history_date, :symbol, :n_shares, :unit_cost, :current_price, :name)
 """
@@ -382,18 +606,165 @@ VALUES(:account, :history_date, :symbol, :n_shares, :unit_cost, :current_price,
             raise e
         print('trade history for %s: %d' % (account, count))
 
+
+    def insert_price_history(self, values):
+        """
+        Insert a trade history row in the compact tables. The position is
+        only inserted when it is new or has changed.
+        """
+        key = (values['account'], values['symbol'])
+        attributes = (values['n_shares'], values['unit_cost'], values['name'])
+        position = self.positions.get(key)
+        if position is None or position[1:] != attributes:
+            sql = """INSERT INTO position (account, symbol, n_shares, unit_cost, name)
+VALUES(:account, :symbol, :n_shares, :unit_cost, :name)
+"""
+            self.cur.execute(sql, values)
+            position = self.positions[key] = (self.cur.lastrowid,) + attributes
+        sql = """INSERT INTO price_history (position_id, history_date, current_price)
+VALUES(?, ?, ?)
+"""
+        self.cur.execute(sql, (position[0], values['history_date'], values['current_price']))
+
+
+    def load_realized_gains(self):
+        """
+        Match the sells of capital assets with their buys and save the
+        gain or loss of each match, so the tax reports don't need to.
+        Losses in taxable accounts are checked for wash sales.
+        """
+        trades = []
+        for values in self.trade_confirmations:
+            if values['trade_type'] in CAPITAL_ASSETS:
+                if isinstance(values['trade_date'], str):
+                    values['trade_date'] = datetime.strptime(values['trade_date'].split(' ', 1)[0],
+                                                             '%Y-%m-%d')
+                trades.append(values)
+        self.cur.execute('SELECT number, taxable FROM account')
+        taxable = dict(self.cur.fetchall())
+        # Replacement shares can be bought in any account.
+        wash_sales = WashSales(trades)
+        count = 0
+        n_wash_sales = 0
+        sql = """INSERT INTO realized_gain (sell_id, buy_id, account, symbol, name, acquired_date,
+  sold_date, sale_year, n_shares, cost, proceeds, gain, held_days, is_long_term,
+  adjustment_code, adjustment)
+VALUES(:sell_id, :buy_id, :account, :symbol, :name, :acquired_date,
+  :sold_date, :sale_year, :n_shares, :cost, :proceeds, :gain, :held_days, :is_long_term,
+  :adjustment_code, :adjustment)
+"""
+        matches = LotMatcher(self.args.method).match(trades)
+        # The matches of each sell are together, in sell order.
+        adjustments = []
+        for (_, sale) in groupby(matches, key=lambda match: match.sell['id']):
+            sale = list(sale)
+            adjustments += wash_sales.adjust_sale(sale, taxable.get(sale[0].sell['account'], True))
+        for (match, adjustment) in zip(matches, adjustments):
+            sell = match.sell
+            buy = match.buy
+            count += 1
+            if adjustment.code:
+                n_wash_sales += 1
+            self.cur.execute(sql, dict(sell_id=sell['id'],
+                                       buy_id=buy['id'] if buy else None,
+                                       account=sell['account'],
+                                       symbol=sell['symbol'],
+                                       name=sell['name'],
+                                       acquired_date=buy['trade_date'].strftime('%Y-%m-%d') if buy else None,
+                                       sold_date=sell['trade_date'].strftime('%Y-%m-%d'),
+                                       sale_year=sell['trade_date'].year,
+                                       n_shares=match.n_shares,
+                                       cost=match.cost,
+                                       proceeds=match.proceeds,
+                                       gain=match.proceeds - match.cost + adjustment.disallowed_loss,
+                                       held_days=held_days(match),
+                                       is_long_term=is_long_term(match),
+                                       adjustment_code=adjustment.code,
+                                       adjustment=adjustment.disallowed_loss))
+        print('realized gains:', count, 'wash sales:', n_wash_sales)
+
+
+    def load_income(self):
+        """
+        Copy the dividends and interest from activity, with their running sums.
+        """
+        sql = """SELECT id activity_id, account, coalesce(symbol, name) symbol,
+  substr(activity_date, 1, 10) income_date, activity_type, amount
+FROM activity
+WHERE activity_type IN (%s) AND amount IS NOT NULL
+ORDER BY income_date, id""" % (', '.join(['?'] * len(INCOME_TYPES)),)
+        self.cur.execute(sql, INCOME_TYPES)
+        columns = [d[0] for d in self.cur.description]
+        rows = running_sums([dict(zip(columns, row)) for row in self.cur.fetchall()])
+        sql = """INSERT INTO income (activity_id, account, symbol, income_date, activity_type,
+  amount, symbol_cumulative, account_cumulative)
+VALUES(:activity_id, :account, :symbol, :income_date, :activity_type,
+  :amount, :symbol_cumulative, :account_cumulative)
+"""
+        self.cur.executemany(sql, rows)
+        print('income:', len(rows))
+
+
+    def load_security_names(self):
+        """
+        Collect the distinct symbols and names of the securities, for app.names.
+        """
+        sql = """SELECT 'trade_confirmation' table_name, symbol, name, count(*) n_rows
+FROM trade_confirmation GROUP BY symbol, name
+UNION ALL
+SELECT 'activity', symbol, name, count(*) FROM activity
+WHERE symbol IS NOT NULL OR activity_type NOT IN (%s)
+GROUP BY symbol, name
+UNION ALL
+SELECT 'trade_history', symbol, name, count(*) FROM trade_history
+WHERE symbol NOT LIKE '#%%'
+GROUP BY symbol, name""" % (', '.join(['?'] * len(NOT_SECURITIES)),)
+        self.cur.execute(sql, NOT_SECURITIES)
+        rows = [dict(table_name=table_name, symbol=symbol, name=name,
+                     normalized=normalize(name), n_rows=n_rows)
+                for (table_name, symbol, name, n_rows) in self.cur.fetchall()]
+        sql = """INSERT INTO security_name (table_name, symbol, name, normalized, n_rows)
+VALUES(:table_name, :symbol, :name, :normalized, :n_rows)
+"""
+        self.cur.executemany(sql, rows)
+        print('security names:', len(rows))
+
+
+    def load_changes(self):
+        """
+        Save and summarize what changed since the previous load.
+        """
+        if self.previous is None:
+            print('load changes: no previous load')
+            return
+        changes = load_changes.diff(self.previous, load_changes.read_snapshot(self.cur))
+        load_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        sql = """INSERT INTO load_changes (load_date, table_name, change, account, symbol,
+  item_date, detail, n_shares, old_value, new_value)
+VALUES(:load_date, :table_name, :change, :account, :symbol,
+  :item_date, :detail, :n_shares, :old_value, :new_value)
+"""
+        self.cur.executemany(sql, [dict(change._asdict(), load_date=load_date) for change in changes])
+        print('load changes:', len(changes))
+        for line in load_changes.summary(changes):
+            print('  ' + line)
+
         
 def action(args):
     """
     Load the parts in the spreadsheet
     """
-    app = App(args)
-    app.load_accounts()
-    app.load_performance_reviews()
-    app.load_trade_confirmations()
-    app.load_account_detail()
-    app.db_commit()
-    app.db_close()
+    with profiler.profile('s2db', args):
+        app = App(args)
+        for load in (app.load_accounts, app.load_performance_reviews,
+                     app.load_trade_confirmations, app.load_account_detail,
+                     app.load_realized_gains, app.load_income,
+                     app.load_security_names, app.load_changes):
+            with profiler.phase(load.__name__):
+                load()
+        with profiler.phase('commit'):
+            app.db_commit()
+        app.db_close()
     
 
 if __name__ == '__main__':
@@ -0,0 +1,180 @@
+"""
+Run commands in a long lived process, so they don't pay for the imports
+and for reading the tables each time.
+
+The tables are read once and kept. Before each request the database
+file is checked, and the tables are read again if it changed (s2db was
+run).
+
+Requests are one line each: the command name and its options, as on the
+command line. The command's output is returned, followed by a line
+"END <status>", where status is 0 for success. The output is text, so
+compressed output (-z) must go to a file (-o).
+
+Read requests from stdin:
+
+    python -m app.commands.serve
+    stock_sales -y 2021 -f schedule-b
+
+Or listen on a Unix socket, and send requests to it:
+
+    python -m app.commands.serve -s /tmp/invest.sock &
+    python -m app.commands.serve -s /tmp/invest.sock stock_age -f html
+"""
+
+import argparse
+from contextlib import redirect_stderr, redirect_stdout
+import importlib
+from io import StringIO
+import os
+import shlex
+import socket
+import socketserver
+import sys
+import time
+import traceback
+
+from app.html_writer import BinaryOutputError
+
+
+# The commands that can be run. Each app.commands module has build_parser and action.
+COMMANDS = ('holdings', 'income', 'long_term', 'names', 'render_charts', 'report',
+            'returns', 'stock_age', 'stock_sales', 'what_if')
+
+# Tables read ahead of the first request.
+TABLES = ('account', 'activity', 'performance_review', 'trade_confirmation', 'trade_history')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description = globals()['__doc__'],
+                                     formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.usage = 'python -m app.commands.serve [options] [command [options]]'
+    parser.add_argument('-s', '--socket',
+                        default=None,
+                        help='Unix socket to listen on, or to send the request to. '
+                        'Default: read requests from stdin.')
+    parser.add_argument('request', nargs=argparse.REMAINDER,
+                        help='With --socket, send this request to the server and '
+                        'print the result, instead of starting a server.')
+    return parser
+
+
+def command(name):
+    return importlib.import_module('app.commands.' + name)
+
+
+def warm_up():
+    """
+    Import the commands and read the tables, so the first request
+    doesn't need to.
+    """
+    from app.db import database
+    start = time.perf_counter()
+    for name in COMMANDS:
+        try:
+            command(name)
+        except ImportError as e:
+            sys.stderr.write('%s is not available: %s\n' % (name, e))
+    for table in TABLES:
+        database.fetch_all(table)
+    sys.stderr.write('warmed up in %.2fs\n' % (time.perf_counter() - start,))
+
+
+def run(line):
+    """
+    Run one request. Returns (output, status).
+    """
+    from app.db import database
+    words = shlex.split(line)
+    if not words:
+        return ('', 0)
+    if words[0] not in COMMANDS:
+        return ('Unknown command %s. Use one of: %s\n'
+                % (words[0], ', '.join(COMMANDS)), 2)
+    if database.refresh_if_changed():
+        warm_up()
+    out = StringIO()
+    status = 0
+    start = time.perf_counter()
+    with redirect_stdout(out), redirect_stderr(out):
+        try:
+            module = command(words[0])
+            module.action(module.build_parser().parse_args(words[1:]))
+        except SystemExit as e:
+            # argparse errors and --help.
+            status = e.code if isinstance(e.code, int) else 1
+        except BinaryOutputError as e:
+            out.write('Error: %s\n' % (e,))
+            status = 2
+        except Exception:
+            out.write(traceback.format_exc())
+            status = 1
+    sys.stderr.write('%s: %.3fs\n' % (words[0], time.perf_counter() - start))
+    return (out.getvalue(), status)
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            (output, status) = run(line.decode('utf-8'))
+            self.wfile.write(output.encode('utf-8'))
+            if output and not output.endswith('\n'):
+                self.wfile.write(b'\n')
+            self.wfile.write(b'END %d\n' % (status,))
+            self.wfile.flush()
+
+
+def serve_stdin():
+    for line in sys.stdin:
+        (output, status) = run(line)
+        sys.stdout.write(output)
+        if output and not output.endswith('\n'):
+            sys.stdout.write('\n')
+        sys.stdout.write('END %d\n' % (status,))
+        sys.stdout.flush()
+
+
+def serve_socket(path):
+    if os.path.exists(path):
+        os.remove(path)
+    with socketserver.UnixStreamServer(path, RequestHandler) as server:
+        try:
+            server.serve_forever()
+        finally:
+            os.remove(path)
+
+
+def send(path, request):
+    """
+    Send a request to the server and print the result. Returns its status.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        sock.sendall((' '.join([shlex.quote(word) for word in request]) + '\n').encode('utf-8'))
+        f = sock.makefile('rb')
+        for line in f:
+            if line.startswith(b'END '):
+                return int(line.split()[1])
+            sys.stdout.write(line.decode('utf-8'))
+    return 1
+
+
+def action(args):
+    """
+    Start the server, or send it a request.
+    """
+    if args.request:
+        if not args.socket:
+            build_parser().error('--socket is needed to send a request')
+        sys.exit(send(args.socket, args.request))
+    from app.db import database
+    database.enable_cache()
+    warm_up()
+    if args.socket:
+        serve_socket(args.socket)
+    else:
+        serve_stdin()
+
+
+if __name__ == '__main__':
+    action(build_parser().parse_args())
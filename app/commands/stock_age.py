@@ -4,6 +4,9 @@ Show active stock position and its age.
 
 from app.db.trade_confirmation import TradeConfirmation
 from app.db import database
+from app.html_writer import HtmlWriter
+from app.lots import CAPITAL_ASSETS, LotMatcher, held_long_term
+from app.profiling import add_arguments as add_profile_arguments, profiler
 
 
 import argparse
@@ -22,10 +25,20 @@ def build_parser():
     parser = argparse.ArgumentParser(description = globals()['__doc__'],
                                      formatter_class = argparse.RawDescriptionHelpFormatter)
     parser.usage = 'python -m app.commands.stock_age [options]'
-    parser.add_argument('-f', '--format', 
+    parser.add_argument('-f', '--format',
+                        choices=('csv', 'html'),
                         default='csv',
                         help='Format of the output: csv or html. '
                         'Default: %(default)s.')
+    parser.add_argument('-o', '--out_file',
+                        default=None,
+                        help='File to write the output to. '
+                        'Default: stdout.')
+    parser.add_argument('-z', '--gzip', default=False,
+                        action='store_true',
+                        help='Compress the output with gzip, adding .gz to the file name. '
+                        'Default: %(default)s.')
+    add_profile_arguments(parser)
     return parser
 
 
@@ -33,7 +46,10 @@ class App(object):
     def __init__(self, args):
         self.args = args
         self.db_open()
-        self.trade_confirmations = database.fetch_all('trade_confirmation')
+        # Options aren't lots of shares. Leave them out so they don't open
+        # lots, or close stock lots, of the same symbol.
+        self.trade_confirmations = [tc for tc in database.fetch_all('trade_confirmation')
+                                    if tc['trade_type'] in CAPITAL_ASSETS]
         # Retrieve only the date part.
         for tc in self.trade_confirmations:
             tc['trade_date'] = database.fix_date(tc['trade_date'])
@@ -52,74 +68,65 @@ class App(object):
     def db_close(self):
         self.con.close()
 
-    def is_leap(self, year):
-        if (year % 4) == 0:
-            if (year % 100) == 0:
-                if (year % 400) == 0:
-                    return True
-                else:
-                    return False
-            else:
-                return True
-        else:
-            return False
-
-
-    def n_days(self, year):
-        return 366 if self.is_leap(year) else 365
-
-
-    def header_cell(self, contents):
-        print("<th>%s</th>" % (contents,))
-
-
-    def cell(self, contents, align_right=False):
-        print("<td%s>%s</td>" % (' align="right"' if align_right else '', contents,))
-
-
-    def cell_amount(self, dollars):
-        if dollars >= 0:
-            self.cell("%9.2f" % dollars, True)
-        else:
-            self.cell("(%9.2f)" % dollars, True)
-
 
     def report(self):
-        # Note all stocks which have been already sold: close positions.
-        # Collect the stock that were sold for the year.
-        sales = []
-        for tc in self.trade_confirmations:
-            if not tc['is_buy'] and tc['trade_type'] == 'stock':
-                sales.append(tc)
-            # Initialize
-            tc['open'] = True
-        # Match the sales with a purchase.
-        bots = []
-        for sale in sales:
-            found = False
-            for tc in self.trade_confirmations:
-                if sale['symbol'] == tc['symbol'] and tc['is_buy'] and tc['trade_type'] == 'stock':
-                    found = True
-                    tc['open'] = False
-                    sale['open'] = False
-                    bots.append(tc)
-                    break
-            if not found:
-                print('Unable to find matching purchase for %s' % (sale['symbol'],))
-                exit()
-        for tc in sorted(self.trade_confirmations, key=lambda x: x['symbol']):
-            if tc['open']:
-                term = 'long ' if (datetime.now() - tc['trade_date']).days >= 365 else 'short'
-                print(term, tc['symbol'], tc['account'], tc['n_shares'], tc['trade_date'])
+        """
+        Returns an HtmlWriter with the output.
+        """
+        out = HtmlWriter()
+        # Match the sales with their purchases, in one pass. What is left
+        # of each purchase is still open.
+        matcher = LotMatcher()
+        matcher.match(self.trade_confirmations)
+        open_lots = []
+        for key in sorted(matcher.open_lots.keys()):
+            open_lots += matcher.remaining(*key)
+        # Today, without the time, to compare with the trade dates.
+        now = datetime.now()
+        now = datetime(now.year, now.month, now.day)
+        if self.args.format == 'html':
+            out.write("""<html>
+<head>
+<style>
+table, th, td {
+    border: 1px solid black;
+}
+</style>
+</head>
+<body>
+<table>
+<tr>""")
+            for header in ('Term', 'Symbol', 'Account', 'Shares', 'Trade Date'):
+                out.header_cell(header)
+            out.write("</tr>")
+        for lot in open_lots:
+            tc = lot.trade
+            term = 'long ' if held_long_term(tc['trade_date'], now) else 'short'
+            values = (term, tc['symbol'], tc['account'], lot.n_shares, tc['trade_date'])
+            if self.args.format == 'html':
+                out.row([term.strip(), tc['symbol'], tc['account'], lot.n_shares,
+                         tc['trade_date'].strftime('%m/%d/%Y')])
+            else:
+                out.write(' '.join([str(value) for value in values]))
+        if self.args.format == 'html':
+            out.write("""</table>
+</body>
+</html>""")
+        return out
 
 
 def action(args):
     """
     Load the parts in the spreadsheet
     """
-    app = App(args)
-    app.report()
-    app.db_close()
+    with profiler.profile('stock_age', args):
+        with profiler.phase('load'):
+            app = App(args)
+        with profiler.phase('report'):
+            out = app.report()
+        with profiler.phase('save'):
+            out.save(args.out_file, args.gzip)
+        app.db_close()
 
 
 if __name__ == '__main__':
@@ -6,22 +6,36 @@ Outputs HTML to view in a browser for the following:
  Form 8949
 """
 
-from app.db.trade_confirmation import TradeConfirmation
-from app.db.account import Account
 from app.db.activity import Activity
+from app.db.realized_gain import RealizedGain
 from app.db import database
+from app.html_writer import HtmlWriter
+from app.profiling import add_arguments as add_profile_arguments, profiler
 
 import argparse
 from datetime import datetime
 import logging
+import os.path
 import sys
 
 
 LOG = logging.getLogger(__name__)
 
-# Constants used to access trade histories.
-BUY = 1
-SELL = 0
+
+def year_range(arg):
+    """
+    Parse a year or a range of years, e.g. 2015-2025.
+    Returns a (first, last) tuple.
+    """
+    try:
+        (first, _, last) = arg.partition('-')
+        years = (int(first), int(last or first))
+    except ValueError:
+        raise argparse.ArgumentTypeError('%s is not a year or range of years' % (arg,))
+    if years[0] > years[1]:
+        raise argparse.ArgumentTypeError('%s is not a range of years' % (arg,))
+    return years
+
 
 def build_parser():
     """
@@ -34,6 +48,26 @@ def build_parser():
                         default=datetime.now().year - 1,
                         help='The year to produce the report for. '
                         'Default: %(default)s.')
+    years = parser.add_mutually_exclusive_group()
+    years.add_argument('--years', type=year_range,
+                       help='Produce a report for each year in a range, e.g. 2015-2025, '
+                       'writing them to stock_sales_YYYY.html in out_dir.')
+    years.add_argument('--all-years', default=False,
+                       action='store_true',
+                       help='Produce a report for every year with activity or sales, '
+                       'as for --years.')
+    parser.add_argument('-o', '--out_file',
+                        default=None,
+                        help='File to write the report to. '
+                        'Default: stdout.')
+    parser.add_argument('--out_dir',
+                        default='.',
+                        help='Directory to write the reports to for --years and --all-years. '
+                        'Default: %(default)s.')
+    parser.add_argument('-z', '--gzip', default=False,
+                        action='store_true',
+                        help='Compress the output with gzip, adding .gz to file names. '
+                        'Default: %(default)s.')
     parser.add_argument('-d', '--debug', default=False,
                         action='store_true',
                         help='Output debug info.'
@@ -43,6 +77,7 @@ def build_parser():
                         default='all',
                         help='Form to generate HTML for.'
                         ' Default: %(default)s.')
+    add_profile_arguments(parser)
     return parser
 
 
@@ -52,183 +87,56 @@ class App(object):
     """
     def __init__(self, args):
         self.args = args
-        self.account = Account()
-        self.activity = Activity()
-        self.trade_confirmations = database.fetch_all('trade_confirmation')
-        for trade_c in self.trade_confirmations:
-            trade_c['trade_date'] = database.fix_date(trade_c['trade_date'])
-        for act in self.activity.rows:
-            act['activity_date'] = database.fix_date(act['activity_date'])
-        # As defined by the IRS.
-        self.capital_asset = ['bond', 'preferred stock', 'stock']
+        # Only aggregates of the activity are needed. Don't fetch the rows.
+        self.activity = Activity(fetch_rows=False)
+        self.realized_gain = RealizedGain()
         self.do_8949 = '8949' in args.forms or 'all' in args.forms
         self.do_schedule_b = 'schedule-b' in args.forms or 'all' in args.forms
+        # Key is year, value is (interests, dividends). See schedule_b_totals.
+        self.schedule_b = dict()
+        # Key is year, value is the realized gains.
+        self.realized_gains = dict()
 
 
-    def is_leap(self, year):
-        """
-        Return True if this year is a leap year, False otherwise.
-        """
-        if (year % 4) == 0:
-            if (year % 100) == 0:
-                if (year % 400) == 0:
-                    return True
-                else:
-                    return False
-            else:
-                return True
-        else:
-            return False
-
-
-    def n_days(self, year):
-        """
-        Return the number of days in this year.
-        """
-        return 366 if self.is_leap(year) else 365
-
-
-    def header_cell(self, contents):
-        """
-        Output a header table cell.
-        """
-        print("<th>%s</th>" % (contents,))
-
-
-    def cell(self, contents, align_right=False):
-        """
-        Output a normal table cell.
-        """
-        print("<td%s>%s</td>" % (
-            ' align="right"' if align_right else '', contents,))
-
-
-    def cell_amount(self, dollars):
-        """
-        Output a normal table cell containing a dollar amount.
-        """
-        if dollars >= 0:
-            self.cell("%9.2f" % dollars, True)
-        else:
-            self.cell("(%9.2f)" % (-dollars,), True)
-
-
-    def collect_trades(self):
+    def years(self):
         """
-        Match each SELL with its corresponding BUY. Return the
-        transaction history for each symbol+account.
+        Return all of the years with activity or sales.
         """
-        # Key is the symbol+account
-        # value is dict, key=is_buy, value=list of tcs
-        stock_histories = dict()
-        for trade_c in self.trade_confirmations:
-            if trade_c['trade_type'] in self.capital_asset:
-                key = self.stock_history_key(trade_c)
-                if key not in stock_histories:
-                    stock_histories[key] = {BUY: [], SELL: []}
-                stock_histories[key][trade_c['is_buy']].append(trade_c)
-        if self.args.debug:
-            for key in sorted(stock_histories.keys()):
-                sys.stderr.write('stock_histories[%s]=%s\n'
-                                 % (key, stock_histories[key]))
-        return stock_histories
+        years = set(self.realized_gain.sale_years())
+        years.update(self.activity.years())
+        return sorted(years)
 
 
-    def stock_history_key(self, trade_c):
+    def load_years(self, first_year, last_year):
         """
-        Generate the key for a stock_history.
+        Fetch the realized gains and Schedule B totals for a range of
+        years at once, so reporting on each year doesn't need to.
         """
-        return trade_c['symbol'] + ' ' + trade_c['account']
+        self.realized_gains = self.realized_gain.fetch_years(first_year, last_year)
+        self.schedule_b = self.activity.taxable_income(first_year, last_year)
+        for year in range(first_year, last_year + 1):
+            self.realized_gains.setdefault(year, [])
+            self.schedule_b.setdefault(year, (dict(), dict()))
 
 
-    def match_trades(self):
+    def schedule_b_totals(self, year):
         """
-        Match sells with the curresponding buys, taking into account
-        not selling off an entire position. returns array of buys and
-        corresponding sells for stock symbol+account (matching_trades).
+        Return the taxable (interests, dividends) for a year, each a
+        dict keyed by the payer name.
         """
-        matching_trades = []
-        stock_histories = self.collect_trades()
-        for stock_history_key in sorted(stock_histories.keys()):
-            stock_history = stock_histories[stock_history_key]
-            buy_index = 0
-            sell_index = 0
-            buys = []
-            sells = []
-            while True:
-                if sell_index >= len(stock_history[SELL]):
-                    # Ran out of sell orders for this stock symbol+account. If
-                    # there any buy orders left, they are assets we still own.
-                    if buys or sells:
-                        # We were in the middle of a transaction that need
-                        # completing.
-                        matching_trades.append((buys, sells))
-                    break
-                print(f'{buy_index=}, {stock_history=}')
-                this_buy = stock_history[BUY][buy_index]
-                print(f'{this_buy=}')
-                buys.append(this_buy)
-                this_sell = stock_history[SELL][sell_index]
-                sells.append(this_sell)
-                if this_buy['n_shares'] == this_sell['n_shares']:
-                    # There are the same number of shares in the buy and sell
-                    # orders.
-                    matching_trades.append((buys, sells))
-                    buy_index += 1
-                    sell_index += 1
-                    buys = []
-                    sells = []
-                elif this_buy['n_shares'] > this_sell['n_shares']:
-                    # Need to calculate the share price for this buy if we
-                    # haven't already done so.
-                    if 'computed_share_price' in this_buy:
-                        computed_share_price = this_buy['computed_share_price']
-                    else:
-                        # Haven't calculated it yet. Do so now.
-                        computed_share_price = (this_buy['total'] + 0.0) / this_buy['n_shares']
-                        this_buy['computed_share_price'] = computed_share_price
-                    small_buy = this_buy.copy()
-                    small_buy['n_shares'] = this_sell['n_shares']
-                    small_buy['total'] = computed_share_price * small_buy['n_shares']
-                    buys.pop() # pop this_buy
-                    buys.append(small_buy)
-                    # Make this buy order n_shares smaller by the
-                    # n_shares in the sell order.
-                    this_buy['n_shares'] -= this_sell['n_shares']
-                    this_buy['total'] = computed_share_price * this_buy['n_shares']
-                    sell_index += 1
-                else:   # (this_buy['n_shares'] < this_sell['n_shares'])
-                    # Need to calculate the share price for this sell if we
-                    # haven't already done so.
-                    if 'computed_share_price' in this_sell:
-                        computed_share_price = this_sell['computed_share_price']
-                    else:
-                        # Haven't calculated it yet. Do so now.
-                        computed_share_price = (this_sell['total'] + 0.0) / this_sell['n_shares']
-                        # Save it for later.
-                        this_sell['computed_share_price'] = computed_share_price
-                    small_sell = this_sell.copy()
-                    small_sell['n_shares'] = this_buy['n_shares']
-                    small_sell['total'] = computed_share_price * small_sell['n_shares']
-                    sells.pop() # pop this_sell
-                    sells.append(small_sell)
-                    matching_trades.append((buys, sells))
-                    # The buy order is filled. Change this sell order
-                    # to have the remaining shares.
-                    buys = []
-                    sells = []
-                    this_sell['n_shares'] -= this_buy['n_shares']
-                    this_sell['total'] = computed_share_price * this_sell['n_shares']
-                    buy_index += 1
-        return matching_trades
+        if year not in self.schedule_b:
+            self.schedule_b.update(self.activity.taxable_income(year, year))
+        return self.schedule_b.get(year, (dict(), dict()))
 
 
     def report(self, year):
         """
-        Controller for report generation.
+        Controller for report generation. Returns an HtmlWriter with the
+        report.
         """
+        self.out = HtmlWriter()
         # HTML header
-        print("""<html>
+        self.out.write("""<html>
 <head>
 <style>
 table, th, td {
@@ -242,8 +150,9 @@ table, th, td {
             self.render_schedule_b(year)
         if self.do_8949:
             self.render_8949(year)
-        print("""</body>
+        self.out.write("""</body>
 </html>""")
+        return self.out
 
 
     def render_schedule_b(self, year):
@@ -252,67 +161,49 @@ table, th, td {
         this year.
         """
         # Name is the key
-        interests = dict()
-        dividends = dict()
-        for act in self.activity.rows:
-            if act['activity_date'].year != year:
-                continue
-            if self.account.taxable(act['account']):
-                name = act['name']
-                if act['activity_type'] == 'interest':
-                    if name not in interests:
-                        interests[name] = 0
-                    interests[name] += act['amount']
-                elif act['activity_type'] == 'dividend':
-                    if name not in dividends:
-                        dividends[name] = 0
-                    dividends[name] += act['amount']
-                
+        (interests, dividends) = self.schedule_b_totals(year)
+
         # Have all of the detail, now render the report.
         # Printout the details needed by the IRS.
-        print("""
-<table>
-<tr>
-  <th colspan="2">
-  Part I - Interest
-  </th>
-</tr>""")
-        print("<tr>")
-        self.header_cell('Payer')
-        self.header_cell('Amount')
-        print("</tr>")
-        for payer in sorted(interests.keys(), key=lambda x:x.lower()):
-            print("<tr>")
-            self.cell(payer)
-            self.cell_amount(interests[payer])
-            print("</tr>")
-        print("<tr>")
-        self.cell('Total')
-        self.cell_amount(sum(interests.values()))
-        print("</tr>")
-        print("</table>")
-
-        print("""
+        self.render_payers('Part I - Interest', interests)
+        self.render_payers('Part II - Dividends', dividends)
+
+
+    def render_payers(self, title, amounts):
+        """
+        Render a table of the amount from each payer, with a total.
+        """
+        out = self.out
+        out.write("""
 <table>
 <tr>
   <th colspan="2">
-  Part II - Dividends
+  %s
   </th>
-</tr>""")
-        print("<tr>")
-        self.header_cell('Payer')
-        self.header_cell('Amount')
-        print("</tr>")
-        for payer in sorted(dividends.keys(), key=lambda x:x.lower()):
-            print("<tr>")
-            self.cell(payer)
-            self.cell_amount(dividends[payer])
-            print("</tr>")
-        print("<tr>")
-        self.cell('Total')
-        self.cell_amount(sum(dividends.values()))
-        print("</tr>")
-        print("</table>")
+</tr>""" % (title,))
+        out.write("<tr>")
+        out.header_cell('Payer')
+        out.header_cell('Amount')
+        out.write("</tr>")
+        for payer in sorted(amounts.keys(), key=lambda x:x.lower()):
+            out.write("<tr>")
+            out.cell(payer)
+            out.cell_amount(amounts[payer])
+            out.write("</tr>")
+        out.write("<tr>")
+        out.cell('Total')
+        out.cell_amount(sum(amounts.values()))
+        out.write("</tr>")
+        out.write("</table>")
+
+
+    def acquired(self, gain):
+        """
+        Return the date acquired for form 8949.
+        """
+        if gain['acquired_date'] is None:
+            return 'Unknown'
+        return gain['acquired_date'].strftime("%m/%d/%Y")
 
 
     def render_8949(self, year):
@@ -320,138 +211,111 @@ table, th, td {
         Render HTML for Form 8949 Parts I and II for the stock gains/losses
         that are taxable this year.
         """
-        # These are all matching trades, not just this year's
-        matching_trades = self.match_trades()
-
-
-        print("<h3>Part II</h3>")
+        # Lots were matched when the database was loaded.
+        if year in self.realized_gains:
+            realized_gains = self.realized_gains[year]
+        else:
+            realized_gains = self.realized_gain.fetch_year(year)
+        if self.args.debug:
+            for gain in realized_gains:
+                sys.stderr.write('realized_gain=%s\n' % (gain,))
+        # Split into short and long term in one pass.
+        terms = ([], [])
+        for gain in realized_gains:
+            terms[1 if gain['is_long_term'] else 0].append(gain)
+
+        self.out.write("<h3>Part II</h3>")
         # Print out the details needed by the IRS.
-        print("""
-<table>
-<tr>
-  <th colspan="8">
-    Short term sells
-  </th>
-</tr>""")
-        print("<tr>")
-        self.header_cell('Description')
-        self.header_cell('Acquired')
-        self.header_cell('Date Sold')
-        self.header_cell('Proceeds')
-        self.header_cell('Cost')
-        self.header_cell('(f)')
-        self.header_cell('(g)')
-        self.header_cell('Gain or (Loss)')
-        print("</tr>")
-        totals = dict(proceeds=0, cost=0, profit=0)
-        for (buys, sells) in matching_trades:
-            if len(buys) != 1 or len(sells) != 1:
-                print('Multiple buys/sells:')
-                print(buys)
-                print(sells)
-                sys.exit(1)
-            buy = buys[0]
-            sell = sells[0]
-            if sell['trade_date'].year != year:
-                # Trade for another year.
-                continue
-
-            if self.account.taxable(buy['account']):
-                if ((sell['trade_date'] - buy['trade_date']).days
-                        <= self.n_days(year)):
-                    print("<tr>")
-                    self.cell("%d sh. %s" % (buy['n_shares'], buy['name']))
-                    self.cell(buy['trade_date'].strftime("%m/%d/%Y"))
-                    self.cell(sell['trade_date'].strftime("%m/%d/%Y"))
-                    proceeds = sell['total']
-                    self.cell_amount(proceeds)
-                    totals['proceeds'] += proceeds
-                    cost = buy['total']
-                    self.cell_amount(cost)
-                    self.cell('&nbsp;') # F
-                    self.cell('&nbsp;') # G
-                    profit = proceeds - cost
-                    totals['profit'] += profit
-                    self.cell_amount(profit)
-                    print("</tr>")
-        print("<tr>")
-        self.cell('Totals')
-        self.cell('&nbsp;')
-        self.cell('&nbsp;')
-        self.cell_amount(totals['proceeds'])
-        self.cell_amount(totals['cost'])
-        self.cell('&nbsp;')
-        self.cell('&nbsp;')
-        self.cell_amount(totals['profit'])
-        print("</tr>")
-        print("""
+        self.out.write("""
+<table>""")
+        self.render_8949_part('Short term sells', terms[0])
+        self.out.write("""
 </table>
-<table>
-<tr>
+<table>""")
+        self.render_8949_part('Long term sells', terms[1])
+        self.out.write("</table>")
+
+
+    def render_8949_part(self, title, realized_gains):
+        """
+        Render the rows of a short or long term table, with totals.
+        """
+        out = self.out
+        out.write("""<tr>
   <th colspan="8">
-    Long term sells
+    %s
   </th>
-</tr>""")
-        print("<tr>")
-        self.header_cell('Description')
-        self.header_cell('Acquired')
-        self.header_cell('Date Sold')
-        self.header_cell('Proceeds')
-        self.header_cell('Cost')
-        self.header_cell('(f)')
-        self.header_cell('(g)')
-        self.header_cell('Gain or (Loss)')
-        print("</tr>")
-        totals = dict(proceeds=0, cost=0, profit=0)
-        for (buys, sells) in matching_trades:
-            if len(buys) != 1 or len(sells) != 1:
-                print('Multiple buys/sells:')
-                print(buys)
-                print(sells)
-                sys.exit(1)
-            buy = buys[0]
-            sell = sells[0]
-            if sell['trade_date'].year != year:
-                # Trade for another year.
-                continue
-
-            if self.account.taxable(buy['account']):
-                if ((sell['trade_date'] - buy['trade_date']).days
-                        > self.n_days(year)):
-                    print("<tr>")
-                    self.cell("%d sh. %s" % (buy['n_shares'], buy['name']))
-                    self.cell(buy['trade_date'].strftime("%m/%d/%Y"))
-                    self.cell(sell['trade_date'].strftime("%m/%d/%Y"))
-                    proceeds = sell['total']
-                    self.cell_amount(proceeds)
-                    totals['proceeds'] += proceeds
-                    cost = buy['total']
-                    self.cell_amount(cost)
-                    self.cell('&nbsp;') # F
-                    self.cell('&nbsp;') # G
-                    profit = proceeds - cost
-                    totals['profit'] += profit
-                    self.cell_amount(profit)
-                    print("</tr>")
-        print("<tr>")
-        self.cell('Totals')
-        self.cell('&nbsp;')
-        self.cell('&nbsp;')
-        self.cell_amount(totals['proceeds'])
-        self.cell_amount(totals['cost'])
-        self.cell('&nbsp;')
-        self.cell('&nbsp;')
-        self.cell_amount(totals['profit'])
-        print("</tr>")
-        print("</table>")
+</tr>""" % (title,))
+        out.write("<tr>")
+        for header in ('Description', 'Acquired', 'Date Sold', 'Proceeds', 'Cost',
+                       '(f)', '(g)', 'Gain or (Loss)'):
+            out.header_cell(header)
+        out.write("</tr>")
+        totals = dict(proceeds=0, cost=0, adjustment=0, profit=0)
+        for gain in realized_gains:
+            out.write("<tr>")
+            out.cell("%d sh. %s" % (gain['n_shares'], gain['name']))
+            out.cell(self.acquired(gain))
+            out.cell(gain['sold_date'].strftime("%m/%d/%Y"))
+            proceeds = gain['proceeds']
+            out.cell_amount(proceeds)
+            totals['proceeds'] += proceeds
+            cost = gain['cost']
+            out.cell_amount(cost)
+            totals['cost'] += cost
+            if gain['adjustment_code']:
+                out.cell(gain['adjustment_code']) # F
+                out.cell_amount(gain['adjustment']) # G
+                totals['adjustment'] += gain['adjustment']
+            else:
+                out.cell('&nbsp;') # F
+                out.cell('&nbsp;') # G
+            profit = gain['gain']
+            totals['profit'] += profit
+            out.cell_amount(profit)
+            out.write("</tr>")
+        out.write("<tr>")
+        out.cell('Totals')
+        out.cell('&nbsp;')
+        out.cell('&nbsp;')
+        out.cell_amount(totals['proceeds'])
+        out.cell_amount(totals['cost'])
+        out.cell('&nbsp;')
+        if totals['adjustment']:
+            out.cell_amount(totals['adjustment'])
+        else:
+            out.cell('&nbsp;')
+        out.cell_amount(totals['profit'])
+        out.write("</tr>")
 
 
 def action(args):
     """
     Load the parts in the spreadsheet
     """
-    app = App(args)
-    app.report(args.year)
+    with profiler.profile('stock_sales', args):
+        with profiler.phase('load'):
+            app = App(args)
+        if args.years or args.all_years:
+            if args.all_years:
+                years = app.years()
+            else:
+                years = list(range(args.years[0], args.years[1] + 1))
+            if not years:
+                return
+            with profiler.phase('load_years'):
+                app.load_years(years[0], years[-1])
+            for year in years:
+                filename = os.path.join(args.out_dir, 'stock_sales_%d.html' % (year,))
+                with profiler.phase('report'):
+                    out = app.report(year)
+                with profiler.phase('save'):
+                    print(out.save(filename, args.gzip))
+        else:
+            with profiler.phase('report'):
+                out = app.report(args.year)
+            with profiler.phase('save'):
+                out.save(args.out_file, args.gzip)
 
 
 if __name__ == '__main__':
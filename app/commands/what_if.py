@@ -0,0 +1,148 @@
+"""
+Show the short and long term gain of a proposed sale, for each way of
+choosing the lots to sell.
+
+Example: python -m app.commands.what_if XYZ 100 -a 5304-3149
+
+With -i, questions are read from stdin, one per line:
+  SYMBOL N_SHARES [ACCOUNT] [PRICE]
+so many scenarios can be tried without reloading.
+"""
+
+from app.db.account import Account
+from app.db.trade_history import TradeHistory
+from app.db import database
+from app.what_if import ORDERS, WhatIf
+
+import argparse
+from datetime import datetime
+import sys
+
+
+def positive(arg):
+    """
+    Parse a number of shares, which must be more than 0.
+    """
+    n_shares = float(arg)
+    if not n_shares > 0:
+        raise argparse.ArgumentTypeError('the number of shares must be more than 0, not %s' % (arg,))
+    return n_shares
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description = globals()['__doc__'],
+                                     formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.usage = 'python -m app.commands.what_if [options] [symbol n_shares]'
+    parser.add_argument('symbol', nargs='?',
+                        help='The stock to sell.')
+    parser.add_argument('n_shares', nargs='?', type=positive,
+                        help='The number of shares to sell.')
+    parser.add_argument('-a', '--account',
+                        default=None,
+                        help='Account number or name. '
+                        'Default: the only account holding the stock.')
+    parser.add_argument('-p', '--price', type=float,
+                        default=None,
+                        help='Sale price per share. '
+                        'Default: the latest current_price in trade_history.')
+    parser.add_argument('-d', '--date',
+                        default=None,
+                        help='Sale date, YYYY-MM-DD. Default: today.')
+    parser.add_argument('-m', '--methods', nargs='*',
+                        choices=ORDERS,
+                        default=ORDERS,
+                        help='Ways of choosing the lots to sell. '
+                        'Default: %(default)s.')
+    parser.add_argument('-i', '--interactive', default=False,
+                        action='store_true',
+                        help='Read questions from stdin. '
+                        'Default: %(default)s.')
+    return parser
+
+
+class App(object):
+    def __init__(self, args):
+        self.args = args
+        if args.date:
+            as_of = datetime.strptime(args.date, '%Y-%m-%d')
+        else:
+            as_of = datetime.now()
+        self.accounts = Account()
+        trades = database.fetch_all('trade_confirmation')
+        for trade in trades:
+            trade['trade_date'] = database.fix_date(trade['trade_date'])
+        self.what_if = WhatIf(trades, as_of)
+        self.prices = TradeHistory(fetch_rows=False).latest_prices()
+
+
+    def find_account(self, symbol, account):
+        """
+        Return the account number, given its number or name, or the only
+        account that holds the symbol.
+        """
+        if account:
+            for row in self.accounts.rows:
+                if account in (row['number'], row['name']):
+                    return row['number']
+            raise ValueError('Unknown account %s' % (account,))
+        accounts = self.what_if.accounts(symbol)
+        if len(accounts) != 1:
+            raise ValueError('%s is held in %s. Specify the account.'
+                             % (symbol, ', '.join(accounts) or 'no account'))
+        return accounts[0]
+
+
+    def report(self, symbol, n_shares, account=None, price=None):
+        if not n_shares > 0:
+            raise ValueError('The number of shares must be more than 0, not %g' % (n_shares,))
+        account = self.find_account(symbol, account)
+        if price is None:
+            if (symbol, account) not in self.prices:
+                raise ValueError('No price for %s. Specify the price.' % (symbol,))
+            price = self.prices[(symbol, account)]
+        impacts = [self.what_if.impact(symbol, account, n_shares, price, method)
+                   for method in self.args.methods]
+        print('Sell %g of %g shares of %s from %s at %.2f'
+              % (n_shares, self.what_if.n_shares(symbol, account), symbol,
+                 self.accounts.account_name_lookup(account), price))
+        print('%-6s %12s %10s %12s %10s %12s' % ('method', 'proceeds', 'short sh.', 'short gain',
+                                                  'long sh.', 'long gain'))
+        for impact in impacts:
+            print('%-6s %12.2f %10g %12.2f %10g %12.2f'
+                  % (impact.method, impact.proceeds, impact.short_shares, impact.short_gain,
+                     impact.long_shares, impact.long_gain))
+
+
+    def interactive(self):
+        for line in sys.stdin:
+            fields = line.split()
+            if not fields:
+                continue
+            try:
+                self.report(fields[0], float(fields[1]),
+                            fields[2] if len(fields) > 2 else None,
+                            float(fields[3]) if len(fields) > 3 else None)
+            except (IndexError, ValueError) as e:
+                print('Error:', e)
+            sys.stdout.flush()
+
+
+def action(args):
+    """
+    Answer the what-if questions.
+    """
+    app = App(args)
+    if args.interactive:
+        app.interactive()
+    elif args.symbol is not None and args.n_shares is not None:
+        try:
+            app.report(args.symbol, args.n_shares, args.account, args.price)
+        except ValueError as e:
+            print('Error:', e)
+            sys.exit(1)
+    else:
+        build_parser().print_usage()
+
+
+if __name__ == '__main__':
+    action(build_parser().parse_args())
@@ -6,6 +6,7 @@ import sys
 import logging
 import sqlite3
 import os.path
+import threading
 from datetime import datetime
 
 
@@ -13,10 +14,22 @@ log = logging.getLogger(__name__)
 
 
 class Database(object):
+    """
+    The rows of the tables, as dicts.
+
+    Each thread gets its own connection, opened on first use, and each
+    call its own cursor, so threads can query at the same time.
+    """
     def __init__(self):
-        self.con = sqlite3.connect(self.locate_db_file())
-        self.cur = self.con.cursor()
+        self.dbfile = self.locate_db_file()
+        # The connection of each thread. See connection.
+        self.local = threading.local()
+        # Bumped when the file changes, so each thread reconnects.
+        self.generation = 0
         self.databases = dict()
+        # Results of fetch_all and query, when caching. See enable_cache.
+        self.cache = None
+        self.mtime = None
 
 
     def add(self, name, database):
@@ -34,22 +47,95 @@ class Database(object):
         return dbfile
 
 
-    def get_columns(self, table_name):
+    def connection(self):
+        """
+        Return this thread's connection, opening it if needed.
+        """
+        con = getattr(self.local, 'con', None)
+        if con is not None and self.local.generation != self.generation:
+            con.close()
+            con = None
+        if con is None:
+            con = self.local.con = sqlite3.connect(self.dbfile)
+            self.local.generation = self.generation
+        return con
+
+
+    def enable_cache(self):
         """
-        Get the column names for the specified table. Also initiates a SELECT * from the table.
+        Keep the results of fetch_all and query, for a long running
+        process. The rows are shared between callers, so they may only
+        add derived values to them (like fix_date). Call
+        refresh_if_changed to drop the results when the file changes.
         """
-        sql = 'SELECT * FROM %s' % (table_name,)
-        self.cur.execute(sql)
+        self.cache = dict()
+        self.mtime = os.path.getmtime(self.dbfile)
 
-        return [d[0] for d in self.cur.description]
+
+    def refresh_if_changed(self):
+        """
+        If the database file changed (it was reloaded), drop the cached
+        results. Each thread reconnects on its next query. Returns True
+        if it changed.
+        """
+        mtime = os.path.getmtime(self.dbfile)
+        if mtime == self.mtime:
+            return False
+        self.generation += 1
+        self.databases = dict()
+        if self.cache is not None:
+            self.cache = dict()
+        self.mtime = mtime
+        return True
+
+
+    def get_columns(self, table_name):
+        """
+        Get the column names for the specified table.
+        """
+        cur = self.connection().execute('SELECT * FROM %s LIMIT 0' % (table_name,))
+        cols = [d[0] for d in cur.description]
+        cur.close()
+        return cols
 
 
     def fetch_all(self, table_name):
         """
         Return all rows of a table as a list of dicts, where the keys for a dict are column names.
         """
-        cols = self.get_columns(table_name)
-        return [dict(zip(cols, row)) for row in self.cur.fetchall()]
+        if self.cache is not None and table_name in self.cache:
+            return list(self.cache[table_name])
+        rows = self.select('SELECT * FROM %s' % (table_name,))
+        if self.cache is not None:
+            self.cache[table_name] = rows
+            return list(rows)
+        return rows
+
+
+    def query(self, sql, params=()):
+        """
+        Run a query. Return the rows as a list of dicts, where the keys for a dict are column names.
+        """
+        key = (sql, tuple(params))
+        if self.cache is not None and key in self.cache:
+            return list(self.cache[key])
+        rows = self.select(sql, params)
+        if self.cache is not None:
+            self.cache[key] = rows
+            return list(rows)
+        return rows
+
+
+    def select(self, sql, params=()):
+        """
+        Run a query on a cursor of its own, and return the rows as dicts.
+        """
+        cur = self.connection().execute(sql, params)
+        try:
+            cols = [d[0] for d in cur.description]
+            return [dict(zip(cols, row)) for row in cur.fetchall()]
+        finally:
+            cur.close()
 
 
     def fix_date(self, d):
@@ -14,14 +14,13 @@ class Account(object):
         self.database = app.db.database
         self.rows = self.database.fetch_all(my_table)
         self.database.add(my_table, self)
+        self.names = dict([(row['number'], row['name']) for row in self.rows])
+        self.taxable_accounts = dict([(row['number'], bool(row['taxable'])) for row in self.rows])
 
 
     def account_name_lookup(self, account_number):
-        for row in self.rows:
-            if row['number'] == account_number:
-                return row['name']
-        return None
+        return self.names.get(account_number)
 
 
     def taxable(self, account_number):
-        return 'IRA' not in self.account_name_lookup(account_number)
+        return self.taxable_accounts[account_number]
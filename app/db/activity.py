@@ -11,9 +11,12 @@ my_table = 'activity'
 
 
 class Activity(object):
-    def __init__(self):
+    def __init__(self, fetch_rows=True):
+        """
+        fetch_rows - set to False if only the aggregate queries are used.
+        """
         self.database = app.db.database
-        self.rows = self.database.fetch_all(my_table)
+        self.rows = self.database.fetch_all(my_table) if fetch_rows else []
         self.database.add(my_table, self)
         
 
@@ -39,3 +42,48 @@ class Activity(object):
             if row['symbol'] == symbol and row['activity_type'] == activity:
                 rows.append(row)
         return sorted(rows, key=lambda x: x['activity_date'])
+
+
+    def years(self):
+        """
+        Return the sorted list of years with activity.
+        """
+        sql = """SELECT DISTINCT CAST(substr(activity_date, 1, 4) AS integer) year
+FROM activity ORDER BY year"""
+        return [row['year'] for row in self.database.query(sql)]
+
+
+    def taxable_income(self, first_year, last_year):
+        """
+        Sum the interest and dividends in taxable accounts by year and
+        payer name. Returns a dict keyed by year, with value
+        (interests, dividends), each a dict keyed by the payer name.
+        """
+        sql = """SELECT CAST(substr(act.activity_date, 1, 4) AS integer) year,
+  act.activity_type, act.name, sum(act.amount) amount
+FROM activity act
+INNER JOIN account acc ON acc.number = act.account
+WHERE act.activity_type IN ('interest', 'dividend')
+  AND act.activity_date >= ? AND act.activity_date < ?
+  AND acc.taxable
+GROUP BY year, act.activity_type, act.name"""
+        years = dict()
+        for row in self.database.query(sql, ('%04d' % (first_year,), '%04d' % (last_year + 1,))):
+            if row['year'] not in years:
+                years[row['year']] = (dict(), dict())
+            (interests, dividends) = years[row['year']]
+            totals = interests if row['activity_type'] == 'interest' else dividends
+            totals[row['name']] = row['amount']
+        return years
+
+
+    def flows(self, activity_types):
+        """
+        Return (account, date, amount) of the activity of the given types,
+        sorted by date, with date a datetime.
+        """
+        sql = """SELECT account, activity_date, amount FROM activity
+WHERE activity_type IN (%s)
+ORDER BY activity_date""" % (', '.join(['?'] * len(activity_types)),)
+        return [(row['account'], self.database.fix_date(row['activity_date']), row['amount'])
+                for row in self.database.query(sql, tuple(activity_types))]
@@ -0,0 +1,25 @@
+"""
+Details regarding the income (dividends and interest)
+"""
+
+
+import app.db
+from app.income import IncomeIndex
+
+
+my_table = 'income'
+
+
+class Income(object):
+    def __init__(self):
+        self.database = app.db.database
+        # In load order, which is by date.
+        self.rows = self.database.query('SELECT * FROM %s ORDER BY id' % (my_table,))
+        self.database.add(my_table, self)
+
+
+    def index(self):
+        """
+        Return the IncomeIndex of the rows.
+        """
+        return IncomeIndex(self.rows)
@@ -0,0 +1,50 @@
+"""
+Details regarding the realized gains, computed when the database is loaded.
+"""
+
+
+import app.db
+
+
+my_table = 'realized_gain'
+
+
+class RealizedGain(object):
+    def __init__(self):
+        self.database = app.db.database
+        self.database.add(my_table, self)
+
+
+    def fetch_year(self, year):
+        """
+        Fetch the realized gains in taxable accounts for the stocks sold
+        in a year. Sort by sold_date.
+        """
+        return self.fetch_years(year, year).get(year, [])
+
+
+    def fetch_years(self, first_year, last_year):
+        """
+        Fetch the realized gains in taxable accounts for the stocks sold
+        in a range of years with one query. Returns a dict keyed by the
+        sale year, with the rows sorted by sold_date.
+        """
+        sql = """SELECT rg.* FROM realized_gain rg
+INNER JOIN account acc ON acc.number = rg.account
+WHERE rg.sale_year BETWEEN ? AND ? AND acc.taxable
+ORDER BY rg.sold_date, rg.symbol, rg.acquired_date"""
+        years = dict()
+        for row in self.database.query(sql, (first_year, last_year)):
+            row['sold_date'] = self.database.fix_date(row['sold_date'])
+            if row['acquired_date']:
+                row['acquired_date'] = self.database.fix_date(row['acquired_date'])
+            years.setdefault(row['sale_year'], []).append(row)
+        return years
+
+
+    def sale_years(self):
+        """
+        Return the sorted list of years with a sale.
+        """
+        return [row['sale_year'] for row in self.database.query(
+            'SELECT DISTINCT sale_year FROM realized_gain ORDER BY sale_year')]
@@ -0,0 +1,24 @@
+"""
+Details regarding the names and symbols of the securities
+"""
+
+
+import app.db
+from app.names import NameIndex
+
+
+my_table = 'security_name'
+
+
+class SecurityName(object):
+    def __init__(self):
+        self.database = app.db.database
+        self.rows = self.database.fetch_all(my_table)
+        self.database.add(my_table, self)
+
+
+    def index(self):
+        """
+        Return the NameIndex of the rows.
+        """
+        return NameIndex(self.rows)
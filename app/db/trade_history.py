@@ -10,12 +10,27 @@ my_table = 'trade_history'
 
 
 class TradeHistory(object):
-    def __init__(self):
+    def __init__(self, fetch_rows=True):
+        """
+        fetch_rows - set to False if only the queries are used.
+        """
         self.database = app.db.database
-        self.rows = self.database.fetch_all(my_table)
+        self.rows = self.database.fetch_all(my_table) if fetch_rows else []
         self.database.add(my_table, self)
 
 
+    def latest_prices(self):
+        """
+        Return the latest price of each stock, keyed by (symbol, account).
+        """
+        sql = """SELECT th.account, th.symbol, th.current_price FROM trade_history th
+INNER JOIN (SELECT account, symbol, max(history_date) history_date
+            FROM trade_history GROUP BY account, symbol) latest
+USING (account, symbol, history_date)"""
+        return dict([((row['symbol'], row['account']), row['current_price'])
+                     for row in self.database.query(sql)])
+
+
     def fetch(self, account, symbol):
         """
         Fetch the rows in an account that relate to a stock symbol.
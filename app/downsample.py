@@ -0,0 +1,45 @@
+"""
+Reduce the number of points in a graph while keeping its shape.
+"""
+
+
+def downsample(points, n_out):
+    """
+    Reduce a list of (x,y) points to n_out points using the
+    Largest-Triangle-Three-Buckets algorithm. The first and last
+    points are always kept. Of the points in each bucket in between,
+    the one forming the largest triangle with the previously chosen
+    point and the average of the next bucket is kept, which preserves
+    the peaks and valleys of the graph.
+
+    Returns the points unchanged if there are not more than n_out of
+    them, or if n_out is too small to be useful (< 3).
+    """
+    n_in = len(points)
+    if n_out < 3 or n_in <= n_out:
+        return points
+    sampled = [points[0]]
+    # Bucket size. The first and last points are their own buckets.
+    every = (n_in - 2) / (n_out - 2)
+    a = 0                       # Index of the previously chosen point
+    for i in range(n_out - 2):
+        # Average of the next bucket, the third vertex of the triangle.
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n_in)
+        n_next = next_end - next_start
+        avg_x = sum(p[0] for p in points[next_start:next_end]) / n_next
+        avg_y = sum(p[1] for p in points[next_start:next_end]) / n_next
+
+        # Pick the point in this bucket with the largest triangle.
+        (ax, ay) = points[a]
+        max_area = -1
+        for j in range(int(i * every) + 1, next_start):
+            (x, y) = points[j]
+            area = abs((ax - avg_x) * (y - ay) - (ax - x) * (avg_y - ay))
+            if area > max_area:
+                max_area = area
+                max_j = j
+        sampled.append(points[max_j])
+        a = max_j
+    sampled.append(points[-1])
+    return sampled
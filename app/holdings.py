@@ -0,0 +1,183 @@
+"""
+Holdings and cost basis of an account on any date.
+
+The trade confirmations and the activity that changes share counts
+(stock distributions, dividend reinvestments) are replayed in date
+order for each account. Every `interval` events a copy of the holdings
+is kept as a checkpoint, so the holdings on a date are the nearest
+earlier checkpoint plus at most `interval` events.
+
+Cost basis is the average cost: a sale reduces the cost in proportion
+to the shares sold. Options are not holdings, so only the capital asset
+trades are replayed.
+
+s2db gives each stock distribution and dividend reinvestment its
+n_shares. Those it can't are left out.
+
+To measure the query time on synthetic confirmations:
+
+    python -m app.holdings -n 1000000
+"""
+
+import argparse
+from bisect import bisect_right
+from datetime import timedelta
+import random
+import time
+
+from app.lots import CAPITAL_ASSETS, synthetic_trades
+
+
+# Activity that changes the number of shares held. Buys and sells are
+# in trade_confirmation.
+SHARE_ACTIVITY = ('stock distribution', 'dividend reinvestment')
+
+
+def trade_events(trades):
+    """
+    Convert trade_confirmation rows to (date, account, symbol, shares, cost)
+    events. A sell has negative shares, and its cost is worked out when
+    it is replayed. Options are left out.
+    """
+    return [(trade['trade_date'], trade['account'], trade['symbol'],
+             trade['n_shares'] if trade['is_buy'] else -trade['n_shares'],
+             trade['total'] if trade['is_buy'] else None)
+            for trade in trades if trade['trade_type'] in CAPITAL_ASSETS]
+
+
+def activity_events(activities):
+    """
+    Convert activity rows that add shares to events. A stock
+    distribution adds shares with no cost. A reinvestment adds the
+    shares bought with the dividend.
+    """
+    events = []
+    for act in activities:
+        if act['activity_type'] in SHARE_ACTIVITY and act['n_shares']:
+            cost = abs(act['amount'] or 0.0) if act['activity_type'] == 'dividend reinvestment' else 0.0
+            events.append((act['activity_date'], act['account'], act['symbol'],
+                           act['n_shares'], cost))
+    return events
+
+
+def apply(holdings, symbol, shares, cost):
+    """
+    Apply an event to holdings, a dict keyed by symbol with value
+    [n_shares, cost].
+    """
+    position = holdings.get(symbol)
+    if position is None:
+        position = holdings[symbol] = [0, 0.0]
+    if shares >= 0:
+        position[0] += shares
+        position[1] += cost
+    else:
+        if position[0] > 0:
+            position[1] -= position[1] * min(-shares, position[0]) / position[0]
+        position[0] += shares
+    if not position[0]:
+        del holdings[symbol]
+
+
+class AccountHistory(object):
+    """
+    The events of one account, in date order, with checkpoints.
+    """
+    def __init__(self, events, interval):
+        self.interval = interval
+        self.events = sorted(events, key=lambda event: event[0])
+        self.dates = [event[0] for event in self.events]
+        # checkpoints[i] is the holdings before events[i * interval].
+        self.checkpoints = []
+        holdings = dict()
+        for (i, (_, _, symbol, shares, cost)) in enumerate(self.events):
+            if i % interval == 0:
+                self.checkpoints.append(self.copy(holdings))
+            apply(holdings, symbol, shares, cost)
+
+
+    def copy(self, holdings):
+        return dict([(symbol, list(position)) for (symbol, position) in holdings.items()])
+
+
+    def at(self, date):
+        """
+        Return the holdings at the end of date.
+        """
+        n_events = bisect_right(self.dates, date)
+        if not n_events:
+            return dict()
+        checkpoint = (n_events - 1) // self.interval
+        holdings = self.copy(self.checkpoints[checkpoint])
+        for (_, _, symbol, shares, cost) in self.events[checkpoint * self.interval:n_events]:
+            apply(holdings, symbol, shares, cost)
+        return holdings
+
+
+class Holdings(object):
+    def __init__(self, trades, activities=(), interval=256):
+        """
+        trades - trade_confirmation rows, with trade_date a datetime.
+
+        activities - activity rows, with activity_date a datetime.
+
+        interval - number of events between checkpoints.
+        """
+        by_account = dict()
+        for event in trade_events(trades) + activity_events(activities):
+            by_account.setdefault(event[1], []).append(event)
+        self.accounts = dict([(account, AccountHistory(events, interval))
+                              for (account, events) in by_account.items()])
+
+
+    def at(self, account, date):
+        """
+        Return the holdings of an account at the end of date, as a dict
+        keyed by symbol with value (n_shares, cost).
+        """
+        history = self.accounts.get(account)
+        if history is None:
+            return dict()
+        return dict([(symbol, tuple(position)) for (symbol, position) in history.at(date).items()])
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description = globals()['__doc__'],
+                                     formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.usage = 'python -m app.holdings [options]'
+    parser.add_argument('-n', '--n_trades', type=int,
+                        default=1000000,
+                        help='Number of synthetic trade confirmations. '
+                        'Default: %(default)s.')
+    parser.add_argument('-i', '--interval', type=int,
+                        default=256,
+                        help='Number of events between checkpoints. '
+                        'Default: %(default)s.')
+    parser.add_argument('-q', '--n_queries', type=int,
+                        default=1000,
+                        help='Number of random queries to time. '
+                        'Default: %(default)s.')
+    return parser
+
+
+def benchmark(args):
+    trades = synthetic_trades(args.n_trades)
+    start = time.perf_counter()
+    holdings = Holdings(trades, interval=args.interval)
+    print('build %d events: %.2fs' % (len(trades), time.perf_counter() - start))
+    rng = random.Random(2)
+    accounts = sorted(holdings.accounts.keys())
+    first = trades[0]['trade_date']
+    n_days = (trades[-1]['trade_date'] - first).days
+    queries = [(rng.choice(accounts), first + timedelta(days=rng.randrange(n_days + 1)))
+               for i in range(args.n_queries)]
+    start = time.perf_counter()
+    for (account, date) in queries:
+        holdings.at(account, date)
+    elapsed = time.perf_counter() - start
+    print('%d queries: %.3fs, %.3f ms per query' % (len(queries), elapsed,
+                                                     elapsed * 1000 / len(queries)))
+
+
+if __name__ == '__main__':
+    benchmark(build_parser().parse_args())
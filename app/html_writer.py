@@ -0,0 +1,95 @@
+"""
+Collect report output in memory and write it all at once.
+
+Writing a table one print() per cell is slow for large reports. The
+writer appends the pieces to a list and joins them when saving, to a
+file or stdout, optionally gzip compressed.
+"""
+
+import gzip
+import sys
+
+
+class BinaryOutputError(ValueError):
+    """
+    Compressed output was asked for on a stdout that only takes text.
+    """
+
+
+class HtmlWriter(object):
+    def __init__(self):
+        self.parts = []
+
+
+    def write(self, text):
+        """
+        Append text. Like print(), a newline is added.
+        """
+        self.parts.append(text)
+        self.parts.append('\n')
+
+
+    def header_cell(self, contents):
+        """
+        Output a header table cell.
+        """
+        self.parts.append('<th>%s</th>\n' % (contents,))
+
+
+    def cell(self, contents, align_right=False):
+        """
+        Output a normal table cell.
+        """
+        self.parts.append('<td%s>%s</td>\n' % (
+            ' align="right"' if align_right else '', contents,))
+
+
+    def cell_amount(self, dollars):
+        """
+        Output a normal table cell containing a dollar amount.
+        """
+        if dollars >= 0:
+            self.parts.append('<td align="right">%9.2f</td>\n' % (dollars,))
+        else:
+            self.parts.append('<td align="right">(%9.2f)</td>\n' % (-dollars,))
+
+
+    def row(self, cells):
+        """
+        Output a table row of normal cells.
+        """
+        self.parts.append('<tr>\n%s</tr>\n' % (
+            ''.join(['<td>%s</td>\n' % (contents,) for contents in cells]),))
+
+
+    def getvalue(self):
+        return ''.join(self.parts)
+
+
+    def save(self, filename=None, compress=False):
+        """
+        Write everything to the file, or stdout if filename is None, with
+        a single write. If compress, gzip it and add .gz to the filename.
+        Returns the filename written.
+        """
+        text = self.getvalue()
+        if compress:
+            data = gzip.compress(text.encode('utf-8'))
+            if filename:
+                filename += '.gz'
+                with open(filename, 'wb') as f:
+                    f.write(data)
+            else:
+                if not hasattr(sys.stdout, 'buffer'):
+                    # serve collects the output as text.
+                    raise BinaryOutputError('gzip output needs a file here. Use -o FILE with -z.')
+                sys.stdout.flush()
+                sys.stdout.buffer.write(data)
+                sys.stdout.buffer.flush()
+        elif filename:
+            with open(filename, 'w') as f:
+                f.write(text)
+        else:
+            sys.stdout.write(text)
+            sys.stdout.flush()
+        return filename
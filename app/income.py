@@ -0,0 +1,123 @@
+"""
+Income (dividends and interest) over any range of dates.
+
+s2db writes the income table when it loads the activity: one row per
+dividend or interest payment, sorted by date, with two running sums:
+
+    symbol_cumulative   - the income of the symbol in the account so far
+    account_cumulative  - the income of the account so far
+
+IncomeIndex keeps the dates and running sums of each series as lists, so
+the income between two dates is two bisects and a subtraction:
+
+    index = IncomeIndex(Income().rows)
+    index.total('5304-3149', 'AAA', '2021-01-01', '2022-01-01')
+    index.total('5304-3149', None, '2021-01-01', '2022-01-01')
+
+Dates are YYYY-MM-DD strings, start inclusive and end exclusive.
+Interest has no symbol, so its series is keyed by the payer's name.
+"""
+
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+
+# The activity that is income.
+INCOME_TYPES = ('dividend', 'interest')
+
+
+def running_sums(rows):
+    """
+    Add symbol_cumulative and account_cumulative to the income rows,
+    which must be sorted by date. Returns the rows.
+    """
+    symbol_totals = dict()
+    account_totals = dict()
+    for row in rows:
+        key = (row['account'], row['symbol'])
+        symbol_totals[key] = symbol_totals.get(key, 0.0) + row['amount']
+        account_totals[row['account']] = account_totals.get(row['account'], 0.0) + row['amount']
+        row['symbol_cumulative'] = symbol_totals[key]
+        row['account_cumulative'] = account_totals[row['account']]
+    return rows
+
+
+def trailing(end, months=12):
+    """
+    Return the (start, end) dates of the months before end, a datetime,
+    as YYYY-MM-DD strings. end is included.
+    """
+    year = end.year - months // 12
+    month = end.month - months % 12
+    if month < 1:
+        year -= 1
+        month += 12
+    day = end.day
+    while True:
+        try:
+            start = datetime(year, month, day)
+            break
+        except ValueError:
+            day -= 1
+    return ((start + timedelta(days=1)).strftime('%Y-%m-%d'),
+            (end + timedelta(days=1)).strftime('%Y-%m-%d'))
+
+
+class IncomeIndex(object):
+    """
+    The running sums of the income of each symbol in each account, and
+    of each account.
+    """
+    def __init__(self, rows):
+        """
+        rows - income table rows, sorted by date.
+        """
+        # Key is (account, symbol), or (account, None) for the whole
+        # account. Value is ([date], [running sum]).
+        self.series = dict()
+        for row in rows:
+            income_date = row['income_date'][:10]
+            for (key, cumulative) in (((row['account'], row['symbol']), row['symbol_cumulative']),
+                                      ((row['account'], None), row['account_cumulative'])):
+                (dates, sums) = self.series.setdefault(key, ([], []))
+                if dates and dates[-1] == income_date:
+                    # Same day: keep the sum at the end of the day.
+                    sums[-1] = cumulative
+                else:
+                    dates.append(income_date)
+                    sums.append(cumulative)
+
+
+    def cumulative(self, account, symbol, date):
+        """
+        Return the income of the series before date.
+        """
+        series = self.series.get((account, symbol))
+        if series is None:
+            return 0.0
+        (dates, sums) = series
+        i = bisect_left(dates, date)
+        return sums[i - 1] if i else 0.0
+
+
+    def total(self, account, symbol, start, end):
+        """
+        Return the income of a symbol in an account, or of the whole
+        account if symbol is None, from start up to end.
+        """
+        return self.cumulative(account, symbol, end) - self.cumulative(account, symbol, start)
+
+
+    def accounts(self):
+        """
+        Return the sorted accounts with income.
+        """
+        return sorted(set([account for (account, _) in self.series.keys()]))
+
+
+    def symbols(self, account):
+        """
+        Return the sorted symbols (and interest payers) with income in an account.
+        """
+        return sorted([symbol for (key_account, symbol) in self.series.keys()
+                       if key_account == account and symbol is not None])
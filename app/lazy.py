@@ -0,0 +1,48 @@
+"""
+Import modules on first use.
+
+reportlab and openpyxl take longer to import than the rest of a command
+does to start, and most runs don't need them (--help, HTML output,
+stdout reports). A module imported with lazy_import is only imported
+when one of its attributes is first used:
+
+    platypus = lazy_import('reportlab.platypus')
+    ...
+    table = platypus.Table(data)     # reportlab.platypus is imported here
+
+A missing optional package is only an error on the code path that uses
+it.
+"""
+
+import importlib
+import sys
+
+
+class LazyModule(object):
+    """
+    Stands in for a module until one of its attributes is used.
+    """
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+
+    def __getattr__(self, attr):
+        module = self.__dict__['_module']
+        if module is None:
+            module = self.__dict__['_module'] = importlib.import_module(self.__dict__['_name'])
+        return getattr(module, attr)
+
+
+    def __repr__(self):
+        return '<lazy module %r>' % (self.__dict__['_name'],)
+
+
+def lazy_import(name):
+    """
+    Return the module if it is already imported, else a LazyModule.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(name)
@@ -0,0 +1,131 @@
+"""
+What changed between two loads of the spreadsheet.
+
+Before s2db drops the tables, the natural keys of the previous load are
+read into hash tables: a multiset of the trade confirmations and of the
+activity (the same trade can appear twice), and the latest position of
+each stock in each account. After the load the new tables are read the
+same way, and each side is probed against the other's hash table, so
+the diff is linear in the size of the tables.
+
+The changes are:
+
+    trade_confirmation added/removed - new (or deleted) trades
+    activity added/removed           - new (or deleted) activity
+    position opened/closed           - a stock in the latest trade history of
+                                       an account that wasn't there before (or is gone)
+    position shares                  - the number of shares of a position changed
+    position price                   - the price of a position changed
+"""
+
+from collections import Counter, namedtuple
+
+
+# Natural keys. Together they identify a row; id is assigned by the load.
+TRADE_KEY = ('account', 'symbol', 'trade_date', 'is_buy', 'n_shares', 'share_price')
+ACTIVITY_KEY = ('account', 'symbol', 'activity_date', 'activity_type', 'name', 'amount')
+
+Change = namedtuple('Change', 'table_name change account symbol item_date detail '
+                    'n_shares old_value new_value')
+
+
+def read_snapshot(cur):
+    """
+    Read the natural keys of the loaded tables. Returns None if nothing
+    has been loaded.
+    """
+    tables = set([name for (name,) in cur.execute(
+        "SELECT name FROM sqlite_master WHERE type IN ('table', 'view')")])
+    if not set(['trade_confirmation', 'activity', 'trade_history']) <= tables:
+        return None
+    trades = Counter(cur.execute('SELECT %s FROM trade_confirmation' % (', '.join(TRADE_KEY),)))
+    activity = Counter(cur.execute('SELECT %s FROM activity' % (', '.join(ACTIVITY_KEY),)))
+    # Key is (account, symbol), value is (history_date, n_shares, current_price)
+    # at the latest history_date of the account.
+    latest = dict()
+    positions = dict()
+    for (account, symbol, history_date, n_shares, current_price) in cur.execute(
+            'SELECT account, symbol, history_date, n_shares, current_price FROM trade_history'):
+        if symbol is None or str(symbol).startswith('#'):
+            continue
+        if account not in latest or history_date > latest[account]:
+            latest[account] = history_date
+        positions[(account, symbol, history_date)] = (n_shares, current_price)
+    positions = dict([((account, symbol), (history_date, n_shares, current_price))
+                      for ((account, symbol, history_date), (n_shares, current_price)) in positions.items()
+                      if history_date == latest[account]])
+    return dict(trade_confirmation=trades, activity=activity, positions=positions)
+
+
+def multiset_changes(table_name, key, old, new):
+    """
+    Return the added and removed rows of a table, given the Counters of
+    their natural keys.
+    """
+    changes = []
+    for (change, rows) in (('added', new - old), ('removed', old - new)):
+        for (row, count) in rows.items():
+            values = dict(zip(key, row))
+            if table_name == 'trade_confirmation':
+                change_row = Change(table_name, change, values['account'], values['symbol'],
+                                    values['trade_date'], 'buy' if values['is_buy'] else 'sell',
+                                    values['n_shares'], None, values['share_price'])
+            else:
+                change_row = Change(table_name, change, values['account'], values['symbol'],
+                                    values['activity_date'], values['activity_type'],
+                                    None, None, values['amount'])
+            changes += [change_row] * count
+    return changes
+
+
+def position_changes(old, new):
+    """
+    Return the positions opened, closed, or with a different number of
+    shares or price, given the latest positions of each load.
+    """
+    changes = []
+    for ((account, symbol), (history_date, n_shares, price)) in new.items():
+        previous = old.get((account, symbol))
+        if previous is None:
+            changes.append(Change('position', 'opened', account, symbol, history_date, None,
+                                  n_shares, None, price))
+            continue
+        (_, old_n_shares, old_price) = previous
+        if n_shares != old_n_shares:
+            changes.append(Change('position', 'shares', account, symbol, history_date, None,
+                                  n_shares, old_n_shares, n_shares))
+        if price != old_price:
+            changes.append(Change('position', 'price', account, symbol, history_date, None,
+                                  n_shares, old_price, price))
+    for ((account, symbol), (history_date, n_shares, price)) in old.items():
+        if (account, symbol) not in new:
+            changes.append(Change('position', 'closed', account, symbol, history_date, None,
+                                  n_shares, price, None))
+    return changes
+
+
+def diff(old, new):
+    """
+    Return the Changes from snapshot old to snapshot new.
+    """
+    return (multiset_changes('trade_confirmation', TRADE_KEY,
+                             old['trade_confirmation'], new['trade_confirmation'])
+            + multiset_changes('activity', ACTIVITY_KEY, old['activity'], new['activity'])
+            + position_changes(old['positions'], new['positions']))
+
+
+def summary(changes, n_moves=5):
+    """
+    Return the lines of a summary of the changes: the count of each kind,
+    and the largest price moves.
+    """
+    counts = Counter([(change.table_name, change.change) for change in changes])
+    lines = ['%s %s: %d' % (table_name, change, count)
+             for ((table_name, change), count) in sorted(counts.items())]
+    moves = [change for change in changes if change.change == 'price' and change.old_value]
+    moves.sort(key=lambda change: -abs(change.new_value / change.old_value - 1))
+    for change in moves[:n_moves]:
+        lines.append('  %-10s %-12s %10.2f -> %10.2f %+7.1f%%'
+                     % (change.symbol, change.account, change.old_value, change.new_value,
+                        (change.new_value / change.old_value - 1) * 100))
+    return lines
@@ -0,0 +1,300 @@
+"""
+Match sells with the buys (tax lots) they close.
+
+Open lots are kept per symbol+account in a deque (FIFO, LIFO), a heap
+(HIFO) or a dict (specific ID), so each trade is matched in constant (or
+log) time and a lot that is only partly sold just has its share count
+reduced.
+
+To benchmark on synthetic confirmations:
+
+    python -m app.lots -n 1000000
+"""
+
+import argparse
+from collections import deque, namedtuple
+from datetime import datetime, timedelta
+import heapq
+import random
+import sys
+import time
+
+
+METHODS = ('fifo', 'lifo', 'hifo', 'specific')
+
+# Trade types that are capital assets, as defined by the IRS.
+CAPITAL_ASSETS = ('bond', 'preferred stock', 'stock')
+
+# One sell (or part of a sell) matched with one buy (or part of a buy).
+# buy and sell are the trade_confirmation rows. buy is None when there
+# is no open lot for the sell.
+Match = namedtuple('Match', 'buy sell n_shares cost proceeds')
+
+
+class Lot(object):
+    """
+    The shares of a buy that haven't been sold yet.
+    """
+    __slots__ = ('trade', 'n_shares', 'unit_cost')
+
+    def __init__(self, trade):
+        self.trade = trade
+        self.n_shares = trade['n_shares']
+        self.unit_cost = (trade['total'] + 0.0) / trade['n_shares']
+
+
+class OpenLots(object):
+    """
+    The open lots for one symbol+account, in the order the method sells them.
+    """
+    def __init__(self, method):
+        self.method = method
+        self.lots = deque()
+        self.heap = []          # HIFO: (-unit_cost, sequence, lot)
+        self.by_id = dict()     # Specific ID: buy id -> lot
+        self.sequence = 0
+
+
+    def add(self, lot):
+        if self.method == 'hifo':
+            self.sequence += 1
+            heapq.heappush(self.heap, (-lot.unit_cost, self.sequence, lot))
+        else:
+            self.lots.append(lot)
+        if self.method == 'specific':
+            self.by_id[lot.trade['id']] = lot
+
+
+    def next_lot(self, lot_ids=None):
+        """
+        Return the lot the next shares are sold from, or None if there
+        are no open lots. lot_ids are the buy ids chosen for a specific
+        ID sale, in the order to sell them.
+        """
+        if self.method == 'hifo':
+            return self.heap[0][2] if self.heap else None
+        if self.method == 'specific' and lot_ids:
+            for lot_id in lot_ids:
+                lot = self.by_id.get(lot_id)
+                if lot and lot.n_shares:
+                    return lot
+        # Specific ID falls back to FIFO when the chosen lots run out.
+        while self.lots and not self.lots[0].n_shares:
+            # Sold by specific ID. Discard it.
+            self.lots.popleft()
+        if not self.lots:
+            return None
+        return self.lots[-1] if self.method == 'lifo' else self.lots[0]
+
+
+    def close(self, lot):
+        """
+        Remove a lot that has no shares left.
+        """
+        if self.method == 'hifo':
+            heapq.heappop(self.heap)
+        elif self.method == 'lifo':
+            self.lots.pop()
+        elif self.method == 'specific':
+            del self.by_id[lot.trade['id']]
+            if self.lots and self.lots[0] is lot:
+                self.lots.popleft()
+            # Otherwise it is discarded by next_lot when it reaches the front.
+        else:
+            self.lots.popleft()
+
+
+    def __iter__(self):
+        if self.method == 'hifo':
+            return (lot for (_, _, lot) in sorted(self.heap))
+        return (lot for lot in self.lots if lot.n_shares)
+
+
+class LotMatcher(object):
+    """
+    Match the sells of each symbol+account with its open lots.
+
+    method - fifo, lifo, hifo (highest cost first) or specific.
+
+    specific_ids - for the specific method, a dict keyed by the id of a
+    sell with a list of the buy ids it sells, in order. Sells not in the
+    dict, or selling more shares than the chosen lots hold, are FIFO.
+    """
+    def __init__(self, method='fifo', specific_ids=None):
+        if method not in METHODS:
+            raise ValueError('Unknown lot method %s' % (method,))
+        self.method = method
+        self.specific_ids = specific_ids or dict()
+        # Key is (symbol, account), value is OpenLots.
+        self.open_lots = dict()
+
+
+    def key(self, trade):
+        return (trade['symbol'], trade['account'])
+
+
+    def buy(self, trade):
+        key = self.key(trade)
+        if key not in self.open_lots:
+            self.open_lots[key] = OpenLots(self.method)
+        self.open_lots[key].add(Lot(trade))
+
+
+    def sell(self, trade):
+        """
+        Sell shares from the open lots. Returns a list of Matches.
+        """
+        matches = []
+        n_shares = trade['n_shares']
+        unit_proceeds = (trade['total'] + 0.0) / n_shares
+        open_lots = self.open_lots.get(self.key(trade))
+        lot_ids = self.specific_ids.get(trade.get('id'))
+        while n_shares > 0:
+            lot = open_lots.next_lot(lot_ids) if open_lots else None
+            if lot is None:
+                sys.stderr.write('Unable to find matching purchase for %s %s %s\n'
+                                 % (trade['symbol'], trade['account'], trade['trade_date']))
+                matches.append(Match(None, trade, n_shares, 0.0,
+                                     unit_proceeds * n_shares))
+                break
+            shares = min(n_shares, lot.n_shares)
+            matches.append(Match(lot.trade, trade, shares,
+                                 lot.unit_cost * shares,
+                                 unit_proceeds * shares))
+            lot.n_shares -= shares
+            n_shares -= shares
+            if not lot.n_shares:
+                open_lots.close(lot)
+        return matches
+
+
+    def match(self, trades):
+        """
+        Match all of the trades. They are processed by trade_date, buys
+        before sells on the same day. Returns a list of Matches.
+        """
+        matches = []
+        for trade in sorted(trades, key=lambda t: (t['trade_date'], not t['is_buy'])):
+            if trade['is_buy']:
+                self.buy(trade)
+            else:
+                matches += self.sell(trade)
+        return matches
+
+
+    def remaining(self, symbol, account):
+        """
+        Return the open Lots of a symbol+account.
+        """
+        open_lots = self.open_lots.get((symbol, account))
+        return list(open_lots) if open_lots else []
+
+
+def held_days(match):
+    """
+    Return the number of days the shares were held, or None if the
+    purchase isn't known.
+    """
+    if match.buy is None:
+        return None
+    return (match.sell['trade_date'] - match.buy['trade_date']).days
+
+
+def anniversary(acquired_date):
+    """
+    Return the same calendar date a year after acquired_date. Feb 29 maps
+    to Feb 28.
+    """
+    if acquired_date.month == 2 and acquired_date.day == 29:
+        return acquired_date.replace(year=acquired_date.year + 1, day=28)
+    return acquired_date.replace(year=acquired_date.year + 1)
+
+
+def held_long_term(acquired_date, sold_date):
+    """
+    Return True if shares bought on acquired_date and sold on sold_date
+    were held more than a year: sold after the anniversary of the purchase.
+    """
+    return sold_date > anniversary(acquired_date)
+
+
+def is_long_term(match):
+    """
+    Return True if the shares were held more than a year. Shares without
+    a known purchase are treated as short term.
+    """
+    if match.buy is None:
+        return False
+    return held_long_term(match.buy['trade_date'], match.sell['trade_date'])
+
+
+def long_term_date(acquired_date):
+    """
+    Return the first date a sale of shares bought on acquired_date is long
+    term: the day after the anniversary.
+    """
+    return anniversary(acquired_date) + timedelta(days=1)
+
+
+def match_lots(trades, method='fifo', specific_ids=None):
+    """
+    Convenience function. Match the trades, returning a list of Matches.
+    """
+    return LotMatcher(method, specific_ids).match(trades)
+
+
+def synthetic_trades(n_trades, n_symbols=500, n_accounts=3, seed=1):
+    """
+    Generate trade_confirmation rows: about 60% buys and 40% sells of
+    part of, or all of, the shares held.
+    """
+    rng = random.Random(seed)
+    held = dict()
+    trades = []
+    start = datetime(2000, 1, 1)
+    for i in range(n_trades):
+        key = ('SYM%d' % (rng.randrange(n_symbols),), 'ACCT-%d' % (rng.randrange(n_accounts),))
+        trade_date = start + timedelta(days=i * 7300 // n_trades)
+        price = rng.uniform(5, 200)
+        if held.get(key) and rng.random() < .4:
+            n_shares = rng.randint(1, held[key])
+            is_buy = 0
+            held[key] -= n_shares
+        else:
+            n_shares = rng.randint(1, 500)
+            is_buy = 1
+            held[key] = held.get(key, 0) + n_shares
+        trades.append(dict(id=i + 1, symbol=key[0], account=key[1], trade_date=trade_date,
+                           is_buy=is_buy, n_shares=n_shares, total=price * n_shares,
+                           trade_type='stock'))
+    return trades
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description = globals()['__doc__'],
+                                     formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.usage = 'python -m app.lots [options]'
+    parser.add_argument('-n', '--n_trades', type=int,
+                        default=1000000,
+                        help='Number of synthetic trade confirmations. '
+                        'Default: %(default)s.')
+    parser.add_argument('-m', '--methods', nargs='*',
+                        choices=METHODS[:-1],
+                        default=METHODS[:-1],
+                        help='Lot methods to benchmark. '
+                        'Default: %(default)s.')
+    return parser
+
+
+def benchmark(args):
+    start = time.perf_counter()
+    trades = synthetic_trades(args.n_trades)
+    print('generate %d trades: %.2fs' % (len(trades), time.perf_counter() - start))
+    for method in args.methods:
+        start = time.perf_counter()
+        matches = match_lots(trades, method)
+        print('%-4s %d matches: %.2fs' % (method, len(matches), time.perf_counter() - start))
+
+
+if __name__ == '__main__':
+    benchmark(build_parser().parse_args())
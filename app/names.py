@@ -0,0 +1,188 @@
+"""
+Find securities by name or symbol, and match names to symbols.
+
+The sheets don't spell names the same way: trade confirmations keep the
+" bonds" and " preferred" suffixes, activity names are what is left of
+the description, and a stock may have changed its symbol. s2db writes
+the security_name table when it loads: each distinct (table, symbol,
+name), with the name normalized (lower case, no punctuation, without
+words like "inc", "corp" and "class").
+
+NameIndex keeps, for each trigram of the normalized names and symbols,
+the entries that have it. A lookup counts the trigrams each candidate
+shares with the query by walking the postings of the query's trigrams,
+so only the entries that share a trigram are scored, never every pair.
+The score is the Jaccard similarity of the trigram sets, 0 to 1.
+
+    index = SecurityName().index()
+    index.search('apple')           # [Match(symbol='AAPL', name='Apple Inc', score=0.6)]
+    index.symbol_of('Apple Inc.')   # 'AAPL'
+    index.name_of('AAPL')           # 'Apple Inc'
+"""
+
+from collections import Counter, namedtuple
+import re
+
+
+# Words that don't tell securities apart.
+NOISE_WORDS = set(['inc', 'incorporated', 'corp', 'corporation', 'co', 'company', 'cos',
+                   'ltd', 'limited', 'plc', 'llc', 'lp', 'the', 'class', 'cl', 'common',
+                   'com', 'stock', 'shares', 'shs', 'new', 'adr', 'ads', 'sponsored',
+                   'bonds', 'bond', 'preferred', 'pfd'])
+
+# Activity without a symbol that isn't about a security.
+NOT_SECURITIES = ('cash', 'interest', 'fee', 'withholding',
+                  'Pass thru to Roth IRA from individual')
+
+# The lowest score that counts as a match.
+MIN_SCORE = 0.3
+
+Match = namedtuple('Match', 'symbol name score')
+
+Reconciliation = namedtuple('Reconciliation', 'table_name symbol name match_symbol match_name score')
+
+
+def normalize(name):
+    """
+    Return the name in lower case, with punctuation and noise words removed.
+    """
+    words = re.sub(r'[^a-z0-9]+', ' ', (name or '').lower().replace('&', ' and ')).split()
+    # A share class letter ("class a") is noise too.
+    kept = [word for (i, word) in enumerate(words)
+            if word not in NOISE_WORDS
+            and not (len(word) == 1 and i and words[i - 1] in ('class', 'cl'))]
+    return ' '.join(kept or words)
+
+
+def trigrams(text):
+    """
+    Return the set of trigrams of the words of a normalized text, each
+    word padded with two spaces in front and one behind.
+    """
+    grams = set()
+    for word in text.split():
+        padded = '  %s ' % (word,)
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+class NameIndex(object):
+    """
+    The names and symbols of the securities, with their trigrams.
+    """
+    def __init__(self, rows):
+        """
+        rows - security_name rows: table_name, symbol, name, normalized, n_rows.
+        """
+        self.rows = rows
+        # Key is the symbol, value is a Counter of its names.
+        self.names = dict()
+        # Key is a normalized name, or a symbol in lower case. Value is a
+        # Counter of the symbols it belongs to.
+        self.entries = dict()
+        for row in rows:
+            if row['symbol'] is None:
+                continue
+            self.names.setdefault(row['symbol'], Counter())[row['name']] += row['n_rows']
+            for text in (row['normalized'], row['symbol'].lower()):
+                if text:
+                    self.entries.setdefault(text, Counter())[row['symbol']] += row['n_rows']
+        # Key is a trigram, value is the list of entries that have it.
+        self.postings = dict()
+        # Key is an entry, value is its number of trigrams.
+        self.sizes = dict()
+        for text in self.entries.keys():
+            grams = trigrams(text)
+            self.sizes[text] = len(grams)
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(text)
+
+
+    def similar(self, text, min_score=MIN_SCORE):
+        """
+        Return (score, entry) of the entries similar to a normalized
+        text, best first.
+        """
+        grams = trigrams(text)
+        if not grams:
+            return []
+        shared = Counter()
+        for gram in grams:
+            for entry in self.postings.get(gram, ()):
+                shared[entry] += 1
+        scored = [(count / (len(grams) + self.sizes[entry] - count), entry)
+                  for (entry, count) in shared.items()]
+        return sorted([(score, entry) for (score, entry) in scored if score >= min_score],
+                      key=lambda match: (-match[0], match[1]))
+
+
+    def search(self, text, limit=5, min_score=MIN_SCORE, symbols=None):
+        """
+        Return up to limit Matches of a name or symbol, best first.
+        symbols - if given, only match these symbols.
+        """
+        matches = []
+        seen = set()
+        query = normalize(text)
+        # A symbol typed as is matches itself, whatever the names say.
+        if text in self.names and (symbols is None or text in symbols):
+            matches.append(Match(text, self.name_of(text), 1.0))
+            seen.add(text)
+        for (score, entry) in self.similar(query, min_score):
+            for (symbol, _) in self.entries[entry].most_common():
+                if symbol in seen or (symbols is not None and symbol not in symbols):
+                    continue
+                seen.add(symbol)
+                matches.append(Match(symbol, self.name_of(symbol), round(score, 3)))
+            if len(matches) >= limit:
+                break
+        return matches[:limit]
+
+
+    def name_of(self, symbol):
+        """
+        Return the most used name of a symbol, or None.
+        """
+        names = self.names.get(symbol)
+        if not names:
+            return None
+        return names.most_common(1)[0][0]
+
+
+    def symbol_of(self, name, min_score=MIN_SCORE):
+        """
+        Return the symbol of a name: the symbol most used with the same
+        normalized name, or else the best match. None if nothing matches.
+        """
+        symbols = self.entries.get(normalize(name))
+        if symbols:
+            return symbols.most_common(1)[0][0]
+        matches = self.search(name, limit=1, min_score=min_score)
+        return matches[0].symbol if matches else None
+
+
+    def reconcile(self, min_score=MIN_SCORE):
+        """
+        Match the names and symbols that aren't in trade_confirmation to
+        the securities that are: activity without a symbol, and symbols
+        only in activity or trade_history (a new symbol, or a typo).
+        Returns the Reconciliations, with match_symbol None where nothing
+        matches.
+        """
+        traded = set([row['symbol'] for row in self.rows
+                      if row['table_name'] == 'trade_confirmation' and row['symbol']])
+        reconciliations = []
+        for row in self.rows:
+            if row['table_name'] == 'trade_confirmation' or row['symbol'] in traded:
+                continue
+            matches = self.search(row['name'] or row['symbol'], limit=1, min_score=min_score,
+                                  symbols=traded)
+            if matches:
+                reconciliations.append(Reconciliation(row['table_name'], row['symbol'], row['name'],
+                                                      matches[0].symbol, matches[0].name,
+                                                      matches[0].score))
+            else:
+                reconciliations.append(Reconciliation(row['table_name'], row['symbol'], row['name'],
+                                                      None, None, 0.0))
+        return reconciliations
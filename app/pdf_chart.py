@@ -12,11 +12,16 @@ from reportlab.graphics.shapes import Drawing, Rect, String
 from reportlab.lib import colors
 from datetime import date, timedelta
 from reportlab.graphics.charts.textlabels import Label
+from reportlab.platypus.flowables import Flowable
+from reportlab.lib.units import inch
 from reportlab.graphics.widgets.markers import makeMarker
 from reportlab.graphics import renderPDF
 from reportlab.pdfgen.canvas import Canvas
 import reportlab.lib.colors
 
+from app.downsample import downsample
+from app.time_axis import tick_label
+
 # User Guide Chapter 11 Graphics
 # Page 114
 
@@ -93,6 +98,8 @@ gd = dict(caption='This is the graph caption',
           base_legend_width=10, # Acount for small box and spacing
           base_legend_height=10,
           n_graphs=1,
+          max_points=0,         # Downsample each graph to this many points. 0=all
+          date_labels=False,    # Label the x axis 'Jun 2021' instead of 2021.50
 )
 
 
@@ -115,20 +122,25 @@ def render_chart(filename, caption_text, data, legend_text, **kwargs):
     len(data).  A small colored rectangle appears to the left of the
     text matching the color of the corresponding graph.
 
-    kwargs - allows one to override values in gd. Some of the other
+    kwargs - allows one to override values in gd. Use max_points to
+    downsample long graphs (see downsample). Some of the other
     required parameters could be specified this way, but since they
     are required they are not.
     """
-    gd['caption'] = caption_text
-    gd['legend_text'] = legend_text
+    g = dict(gd)
+    g['caption'] = caption_text
+    g['legend_text'] = legend_text
     for name, value in kwargs.items():
-        if name in gd:
-            gd[name] = value
+        if name in g:
+            g[name] = value
+
+    if g['max_points']:
+        data = [downsample(points, g['max_points']) for points in data]
 
     minx = 1e20
     maxx = 0                    # ordinal date
     maxy = 0                    # money
-    gd['n_graphs'] = len(data)
+    g['n_graphs'] = len(data)
     for points in data:
         for (x,y) in points:
             if x < minx:
@@ -140,30 +152,71 @@ def render_chart(filename, caption_text, data, legend_text, **kwargs):
     # Convert to multiple of a power of 10.
     p = pow(10, int(math.log10(maxy)))
     maxy = math.ceil(maxy / p) * p
-    drawing = Drawing(gd['width'], gd['height'])
+    drawing = Drawing(g['width'], g['height'])
     lp = LinePlot()
-    lp.x = gd['graph_x']
-    lp.y = gd['graph_y']
-    lp.height = gd['graph_height']
-    lp.width = gd['graph_width']
+    lp.x = g['graph_x']
+    lp.y = g['graph_y']
+    lp.height = g['graph_height']
+    lp.width = g['graph_width']
     lp.data = data
     for (i, marker) in zip(range(len(data)), ['FilledCircle', 'FilledTriangle',
                                              'FilledDiamond', 'FilledStarFive',
                                              'FilledSquare', 'FilledPentagon']):
         lp.lines[i].symbol = makeMarker(marker)
-        lp.lines[i].strokeColor = gd['graph_colors'][i]
+        lp.lines[i].strokeColor = g['graph_colors'][i]
     lp.joinedLines = 1
     lp.strokeColor = colors.black
     lp.xValueAxis.valueMin = minx
     lp.xValueAxis.valueMax = maxx
     lp.xValueAxis.valueStep = .5 # Every 6 months
-    lp.xValueAxis.labelTextFormat = '%3.2f'
+    if g['date_labels']:
+        lp.xValueAxis.labelTextFormat = tick_label
+    else:
+        lp.xValueAxis.labelTextFormat = '%3.2f'
     lp.yValueAxis.valueMin = 0
     lp.yValueAxis.valueMax = maxy
     lp.yValueAxis.valueStep = p
     drawing.add(lp)
-    caption(drawing, gd['caption'], gd['width'], gd['graph_height'])
-    legend(drawing, gd)
+    caption(drawing, g['caption'], g['width'], g['graph_height'])
+    legend(drawing, g)
     if filename:
         renderPDF.drawToFile(drawing, filename, 'lineplot with dates')
     return drawing
+
+
+def landscape(chart):
+    """
+    Rotate the chart (graph) so it is in landscape orientation.
+    Translate (x,y) to specify a new origin in lower right part of the page.
+    """
+    chart.rotate(90)
+    chart.translate(-4 * inch, -5.0 * inch)
+    return chart
+
+
+class LazyChart(Flowable):
+    """
+    Placeholder for the chart of one stock. The chart is only built when
+    the page it is on is laid out, and is released once it has been drawn.
+    """
+    def __init__(self, render_chart, account, symbol):
+        Flowable.__init__(self)
+        self.render_chart = render_chart
+        self.account = account
+        self.symbol = symbol
+        self.chart = None
+
+
+    def get_chart(self):
+        if self.chart is None:
+            self.chart = landscape(self.render_chart.render(self.account, self.symbol))
+        return self.chart
+
+
+    def wrap(self, availWidth, availHeight):
+        return self.get_chart().wrap(availWidth, availHeight)
+
+
+    def drawOn(self, canvas, x, y, _sW=0):
+        self.get_chart().drawOn(canvas, x, y, _sW)
+        self.chart = None
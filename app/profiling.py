@@ -0,0 +1,169 @@
+"""
+Time the phases of a command, with --profile.
+
+A command adds the options with add_arguments, wraps its action in
+profiler.profile, and marks its phases:
+
+    with profiler.profile('report', args):
+        with profiler.phase('DataItems'):
+            data_items = DataItems(args)
+
+Without --profile a phase costs a function call. With it, the time (and
+with --memory the peak traced memory) of each phase is recorded, and a
+JSON summary is written when the command ends:
+
+    {"command": "report", "seconds": 12.3, "peak_mb": 80.1,
+     "phases": [{"name": "DataItems", "calls": 1, "seconds": 2.1, "peak_mb": 40.2}, ...]}
+
+A phase that runs many times (one per chart) is one entry, with its
+total time and number of calls. Phases can be nested; the time of the
+inner phases is also part of the outer one. --cprofile also runs the
+command under cProfile and saves the pstats file.
+"""
+
+from contextlib import contextmanager
+from datetime import datetime
+import json
+import sys
+import time
+
+
+def add_arguments(parser):
+    """
+    Add the profiling options to a command's parser.
+    """
+    parser.add_argument('--profile', default=False,
+                        action='store_true',
+                        help='Time the phases of the command, and write a JSON summary. '
+                        'Default: %(default)s.')
+    parser.add_argument('--profile_out',
+                        default=None,
+                        help='The JSON summary file. Default: COMMAND-profile.json.')
+    parser.add_argument('--cprofile',
+                        default=None,
+                        help='With --profile, also save cProfile stats to this file, '
+                        'for pstats or snakeviz.')
+    parser.add_argument('--memory', default=False,
+                        action='store_true',
+                        help='With --profile, also record the peak memory of each phase '
+                        'with tracemalloc. This slows the command down. '
+                        'Default: %(default)s.')
+
+
+class Profiler(object):
+    def __init__(self):
+        self.enabled = False
+        self.memory = False
+        # Key is the phase name, value is [calls, seconds, peak bytes], in the order first started.
+        self.phases = dict()
+        # The running phases: [name, start, peak bytes].
+        self.stack = []
+
+
+    @contextmanager
+    def profile(self, command, args):
+        """
+        Profile the block if args.profile, and write the summary at the end.
+        """
+        if not getattr(args, 'profile', False):
+            yield self
+            return
+        self.enabled = True
+        self.memory = args.memory
+        self.phases = dict()
+        self.stack = []
+        if self.memory:
+            import tracemalloc
+            tracemalloc.start()
+        cprofile = None
+        if args.cprofile:
+            import cProfile
+            cprofile = cProfile.Profile()
+            cprofile.enable()
+        start = time.perf_counter()
+        try:
+            with self.phase(command):
+                yield self
+        finally:
+            seconds = time.perf_counter() - start
+            if cprofile:
+                cprofile.disable()
+                cprofile.dump_stats(args.cprofile)
+            if self.memory:
+                tracemalloc.stop()
+            self.enabled = False
+            self.write(args.profile_out or '%s-profile.json' % (command,),
+                       self.summary(command, seconds, args.cprofile))
+
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Record the time of the block as phase name.
+        """
+        if not self.enabled:
+            yield
+            return
+        if self.memory:
+            import tracemalloc
+            if self.stack:
+                # Keep the parent's peak so far, and measure this phase's own.
+                self.stack[-1][2] = max(self.stack[-1][2], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        totals = self.phases.setdefault(name, [0, 0.0, 0])
+        running = [name, time.perf_counter(), 0]
+        self.stack.append(running)
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - running[1]
+            self.stack.pop()
+            peak = running[2]
+            if self.memory:
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+                if self.stack:
+                    self.stack[-1][2] = max(self.stack[-1][2], peak)
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] = max(totals[2], peak)
+
+
+    def summary(self, command, seconds, cprofile=None):
+        """
+        Return the summary, as a dict.
+        """
+        phases = []
+        for (name, (calls, phase_seconds, peak)) in self.phases.items():
+            if name == command:
+                continue
+            phase = dict(name=name, calls=calls, seconds=round(phase_seconds, 4))
+            if self.memory:
+                phase['peak_mb'] = round(peak / 1e6, 2)
+            phases.append(phase)
+        summary = dict(command=command,
+                       argv=sys.argv[1:],
+                       date=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                       seconds=round(seconds, 4),
+                       phases=phases)
+        if self.memory and command in self.phases:
+            summary['peak_mb'] = round(self.phases[command][2] / 1e6, 2)
+        if cprofile:
+            summary['cprofile'] = cprofile
+        return summary
+
+
+    def write(self, filename, summary):
+        with open(filename, 'w') as f:
+            json.dump(summary, f, indent=2)
+        # stdout may be the command's output, so report on stderr.
+        sys.stderr.write('%-24s %6s %10s%s\n' % ('phase', 'calls', 'seconds',
+                                                 '  peak MB' if self.memory else ''))
+        for phase in summary['phases']:
+            sys.stderr.write('%-24s %6d %10.3f%s\n'
+                             % (phase['name'], phase['calls'], phase['seconds'],
+                                '  %8.1f' % (phase['peak_mb'],) if self.memory else ''))
+        sys.stderr.write('%-24s %6s %10.3f\n' % ('total', '', summary['seconds']))
+        sys.stderr.write('Profile summary is in %s\n' % (filename,))
+
+
+profiler = Profiler()
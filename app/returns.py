@@ -0,0 +1,220 @@
+"""
+Time-weighted and money-weighted returns of the accounts.
+
+performance_review has the market value of each account at each month
+end, and activity the cash moved into or out of the accounts. From them:
+
+    twr       - time-weighted return over the whole history, annualized.
+                Each period's return is the Modified Dietz return, which
+                weights a flow by the part of the period it was invested.
+    xirr      - money-weighted return: the annual rate at which the
+                starting value and the flows grow to the ending value.
+    rolling   - the time-weighted return over the last 1, 3 and 5 years,
+                annualized.
+
+The portfolio is the sum of the accounts; transfers between accounts
+cancel out.
+
+The growth of each account is kept as a running product, so the return
+between any two review dates is a division. XIRR is solved with Newton's
+method for all of the accounts together, stepping every unconverged
+account on each pass.
+"""
+
+from bisect import bisect_right
+from collections import namedtuple
+from datetime import timedelta
+
+
+# Activity that moves money into (positive amount) or out of an account.
+# Everything else (trades, dividends, fees) happens inside the account.
+EXTERNAL_FLOWS = ('cash', 'Pass thru to Roth IRA from individual')
+
+ROLLING_YEARS = (1, 3, 5)
+
+PORTFOLIO = 'Portfolio'
+
+Returns = namedtuple('Returns', 'account start end start_value end_value flows twr xirr rolling')
+
+
+def annualize(total_return, days):
+    """
+    Convert the return over days to an annual rate.
+    """
+    if days <= 0 or total_return <= -1:
+        return None
+    return (1 + total_return) ** (365.25 / days) - 1
+
+
+def dietz(start_value, end_value, flows, start, end):
+    """
+    Return the Modified Dietz return of a period, or None if nothing was
+    invested. flows are (date, amount) in the period.
+    """
+    days = (end - start).days
+    net = sum([amount for (_, amount) in flows])
+    invested = start_value + sum([amount * (end - date).days / days for (date, amount) in flows])
+    if invested <= 0:
+        return None
+    return (end_value - start_value - net) / invested
+
+
+class History(object):
+    """
+    The market values and external flows of one account, or the portfolio.
+    """
+    def __init__(self, account, values, flows):
+        """
+        values - (date, market value) at each review, sorted by date.
+
+        flows - (date, amount) sorted by date.
+        """
+        self.account = account
+        self.dates = [date for (date, _) in values]
+        self.values = [value for (_, value) in values]
+        # Only the flows after the first review count.
+        self.flows = [(date, amount) for (date, amount) in flows
+                      if self.dates and date > self.dates[0]]
+        # growth[i] is the growth of 1 invested at dates[0], at dates[i].
+        self.growth = [1.0]
+        flow_dates = [date for (date, _) in self.flows]
+        for i in range(1, len(self.dates)):
+            start = bisect_right(flow_dates, self.dates[i - 1])
+            end = bisect_right(flow_dates, self.dates[i])
+            period_return = dietz(self.values[i - 1], self.values[i], self.flows[start:end],
+                                  self.dates[i - 1], self.dates[i])
+            self.growth.append(self.growth[-1] * (1 + (period_return or 0.0)))
+
+
+    def twr(self, first=0, last=None):
+        """
+        Return the annualized time-weighted return between reviews first and last.
+        """
+        if last is None:
+            last = len(self.dates) - 1
+        return annualize(self.growth[last] / self.growth[first] - 1,
+                         (self.dates[last] - self.dates[first]).days)
+
+
+    def rolling(self, years, last=None):
+        """
+        Return the annualized time-weighted return over the years before
+        review last, or None if the history is shorter.
+        """
+        if last is None:
+            last = len(self.dates) - 1
+        target = self.dates[last] - timedelta(days=round(365.25 * years))
+        first = bisect_right(self.dates, target) - 1
+        if first < 0 or self.dates[first] < target - timedelta(days=31):
+            return None
+        return self.twr(first, last)
+
+
+    def cash_flows(self):
+        """
+        Return the investor's (years, amount) cash flows, for XIRR: the
+        starting value is paid in, the flows are paid in (or taken out),
+        and the ending value is received.
+        """
+        start = self.dates[0]
+        flows = [(0.0, -self.values[0])]
+        flows += [((date - start).days / 365.25, -amount) for (date, amount) in self.flows]
+        flows.append(((self.dates[-1] - start).days / 365.25, self.values[-1]))
+        return flows
+
+
+def xirr(cash_flows, guess=0.1, tolerance=1e-9, max_iterations=100):
+    """
+    Solve for the annual rate of each list of (years, amount) cash flows,
+    with Newton's method. Returns a list of rates, None where it didn't
+    converge.
+    """
+    rates = [guess] * len(cash_flows)
+    active = [i for (i, flows) in enumerate(cash_flows) if len(flows) > 1]
+    for iteration in range(max_iterations):
+        still_active = []
+        for i in active:
+            growth = 1 + rates[i]
+            value = 0.0
+            derivative = 0.0
+            for (years, amount) in cash_flows[i]:
+                discounted = amount * growth ** -years
+                value += discounted
+                derivative -= years * discounted / growth
+            if not derivative:
+                rates[i] = None
+                continue
+            step = value / derivative
+            rates[i] = max(rates[i] - step, -0.999)
+            if abs(step) > tolerance:
+                still_active.append(i)
+        active = still_active
+        if not active:
+            break
+    for i in active:
+        rates[i] = None
+    for (i, flows) in enumerate(cash_flows):
+        if len(flows) <= 1:
+            rates[i] = None
+    return rates
+
+
+def account_returns(reviews, flows):
+    """
+    Return the Returns of each account and of the portfolio, in account order.
+
+    reviews - performance_review rows, with end_date a datetime.
+
+    flows - (account, date, amount) of the external flows, with date a datetime.
+    """
+    values = dict()
+    for row in reviews:
+        if row['end_market_value'] is not None:
+            values.setdefault(row['account'], []).append((row['end_date'], row['end_market_value']))
+    # The portfolio is valued on the dates every account has a review.
+    portfolio = dict()
+    counts = dict()
+    for account_values in values.values():
+        for (date, value) in account_values:
+            portfolio[date] = portfolio.get(date, 0.0) + value
+            counts[date] = counts.get(date, 0) + 1
+    portfolio = dict([(date, value) for (date, value) in portfolio.items()
+                      if counts[date] == len(values)])
+    account_flows = dict()
+    for (account, date, amount) in sorted(flows, key=lambda flow: flow[1]):
+        account_flows.setdefault(account, []).append((date, amount))
+    histories = [History(account, sorted(values[account]), account_flows.get(account, []))
+                 for account in sorted(values.keys())]
+    histories.append(History(PORTFOLIO, sorted(portfolio.items()),
+                             sorted([(date, amount) for (_, date, amount) in flows])))
+    histories = [history for history in histories if len(history.dates) > 1]
+    rates = xirr([history.cash_flows() for history in histories])
+    return [Returns(history.account, history.dates[0], history.dates[-1],
+                    history.values[0], history.values[-1],
+                    sum([amount for (_, amount) in history.flows]),
+                    history.twr(), rate,
+                    dict([(years, history.rolling(years)) for years in ROLLING_YEARS]))
+            for (history, rate) in zip(histories, rates)]
+
+
+def percent(rate):
+    """
+    Format a rate as a percentage, or blank.
+    """
+    return '' if rate is None else '%.2f%%' % (rate * 100,)
+
+
+def table(returns, account_names=None):
+    """
+    Return (headers, rows) of a table of the returns, with the rates as
+    percentages.
+    """
+    headers = ['Account', 'Start', 'End value', 'Net flows', 'TWR/yr', 'XIRR'] + \
+              ['%d yr' % (years,) for years in ROLLING_YEARS]
+    rows = []
+    for ret in returns:
+        name = (account_names or dict()).get(ret.account, ret.account)
+        rows.append([name, ret.start.strftime('%Y-%m-%d'), '%.2f' % (ret.end_value,),
+                     '%.2f' % (ret.flows,), percent(ret.twr), percent(ret.xirr)]
+                    + [percent(ret.rolling[years]) for years in ROLLING_YEARS])
+    return (headers, rows)
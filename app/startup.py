@@ -0,0 +1,124 @@
+"""
+Measure how long each command takes to import, with python -X importtime,
+and check it against its budget.
+
+A command's startup is the cumulative import time of its module, which
+is what --help, and every run before it does any work, pays. The heavy
+optional packages (reportlab, openpyxl) must not be imported at startup:
+they are imported by app.lazy when the code path that needs them runs.
+
+Run it from the directory with investments.db, as the commands are:
+
+    python -m app.startup
+    python -m app.startup -c report s2db -v
+
+The exit status is 1 if a command is over budget or imports a heavy
+package, so it can be run as a check before committing.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+
+# Startup budget for each command, in milliseconds.
+BUDGETS = dict(holdings=100,
+               income=100,
+               long_term=100,
+               names=100,
+               render_charts=100,
+               report=100,
+               returns=100,
+               s2db=100,
+               serve=60,
+               stock_age=100,
+               stock_sales=100,
+               what_if=100)
+
+# Packages that must only be imported when they are used.
+HEAVY = ('reportlab', 'openpyxl')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description = globals()['__doc__'],
+                                     formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.usage = 'python -m app.startup [options]'
+    parser.add_argument('-c', '--commands', nargs='*',
+                        choices=sorted(BUDGETS.keys()),
+                        default=sorted(BUDGETS.keys()),
+                        help='Commands to measure. Default: all of them.')
+    parser.add_argument('-r', '--repeat', type=int,
+                        default=3,
+                        help='Import each command this many times and keep the fastest. '
+                        'Default: %(default)s.')
+    parser.add_argument('-v', '--verbose', default=False,
+                        action='store_true',
+                        help='List the slowest imports of each command. '
+                        'Default: %(default)s.')
+    return parser
+
+
+def import_times(module):
+    """
+    Import module in a new interpreter. Returns a list of
+    (cumulative_us, depth, name), in the order -X importtime reports them.
+    """
+    env = dict(os.environ)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env['PYTHONPATH'] = os.pathsep.join([root] + [path for path in [env.get('PYTHONPATH')] if path])
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                            env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            universal_newlines=True)
+    if result.returncode:
+        raise RuntimeError('import %s failed:\n%s' % (module, result.stderr))
+    times = []
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:'):
+            continue
+        (_, cumulative, name) = line[len('import time:'):].split('|')
+        if not cumulative.strip().isdigit():
+            continue                    # The header line.
+        times.append((int(cumulative), (len(name) - len(name.lstrip()) - 1) // 2, name.strip()))
+    return times
+
+
+def measure(command, repeat):
+    """
+    Returns (startup_ms, times) for the fastest of repeat imports.
+    """
+    module = 'app.commands.' + command
+    best = None
+    for i in range(repeat):
+        times = import_times(module)
+        startup = sum([cumulative for (cumulative, _, name) in times if name == module]) / 1000.0
+        if best is None or startup < best[0]:
+            best = (startup, times)
+    return best
+
+
+def check(args):
+    """
+    Print the startup time of each command. Returns the number of
+    commands that failed their budget.
+    """
+    n_failed = 0
+    print('%-14s %10s %10s  %s' % ('command', 'ms', 'budget', 'heavy imports'))
+    for command in args.commands:
+        (startup, times) = measure(command, args.repeat)
+        heavy = sorted(set([name for (_, _, name) in times if name.split('.')[0] in HEAVY]))
+        failed = startup > BUDGETS[command] or heavy
+        if failed:
+            n_failed += 1
+        print('%-14s %10.1f %10d  %s%s' % (command, startup, BUDGETS[command],
+                                           ', '.join(heavy) or '-',
+                                           '  FAIL' if failed else ''))
+        if args.verbose:
+            for (cumulative, depth, name) in sorted(times, reverse=True)[:10]:
+                print('    %10.1f  %s' % (cumulative / 1000.0, '  ' * depth + name))
+    return n_failed
+
+
+if __name__ == '__main__':
+    sys.exit(1 if check(build_parser().parse_args()) else 0)
@@ -0,0 +1,150 @@
+"""
+Draw a simple line graph of (x,y) points with a caption as inline SVG,
+and collect the graphs into a single self-contained HTML page.
+
+This is a lightweight alternative to pdf_chart for a quick look in a
+browser. It takes the same data and doesn't need reportlab.
+"""
+
+from html import escape
+import math
+
+from app.downsample import downsample
+from app.time_axis import tick_label
+
+
+# Graph Detail. Same layout as pdf_chart, but the y axis points down.
+gd = dict(width=720,
+          height=360,
+          font_height=10,
+          graph_x=50,
+          graph_y=50,
+          graph_width=540,
+          graph_height=225,
+          graph_colors=('red', 'blue', 'green', 'magenta', 'cyan', 'black'),
+          legend_pad=5,
+          legend_text_indent=10,
+          max_points=0,
+          date_labels=False,
+)
+
+
+def render_svg_chart(caption_text, data, legend_text, **kwargs):
+    """
+    Render the chart with a caption as an SVG string. Allows up to 6
+    simultaneous colored graphs.
+
+    The arguments are the same as pdf_chart.render_chart, without the
+    filename.
+    """
+    g = dict(gd)
+    for name, value in kwargs.items():
+        if name in g:
+            g[name] = value
+    if g['max_points']:
+        data = [downsample(points, g['max_points']) for points in data]
+
+    xs = [x for points in data for (x, y) in points]
+    ys = [y for points in data for (x, y) in points]
+    minx = min(xs)
+    maxx = max(xs)
+    if maxx == minx:
+        maxx = minx + 1
+    # Convert to multiple of a power of 10.
+    maxy = max(ys)
+    p = pow(10, int(math.log10(maxy))) if maxy > 0 else 1
+    maxy = math.ceil(maxy / p) * p if maxy > 0 else 1
+
+    left = g['graph_x']
+    top = g['height'] - g['graph_y'] - g['graph_height']
+    bottom = top + g['graph_height']
+
+    def sx(x):
+        return left + (x - minx) / (maxx - minx) * g['graph_width']
+
+    def sy(y):
+        return bottom - y / maxy * g['graph_height']
+
+    out = ['<svg xmlns="http://www.w3.org/2000/svg" width="%d" height="%d" '
+           'font-family="Helvetica" font-size="%d">'
+           % (g['width'], g['height'], g['font_height'])]
+    out.append('<text x="%d" y="%d" text-anchor="middle" font-size="12">%s</text>'
+               % (g['width'] / 2, top - 20, escape(caption_text)))
+    out.append('<rect x="%d" y="%d" width="%d" height="%d" fill="none" stroke="black"/>'
+               % (left, top, g['graph_width'], g['graph_height']))
+
+    # y axis
+    y = 0
+    while y <= maxy:
+        out.append('<text x="%d" y="%.1f" text-anchor="end">%g</text>'
+                   % (left - 4, sy(y) + 3, y))
+        y += p
+    # x axis, every 6 months
+    x = math.ceil(minx * 2) / 2
+    while x <= maxx:
+        label = tick_label(x) if g['date_labels'] else '%3.2f' % (x,)
+        out.append('<text x="%.1f" y="%d" text-anchor="middle">%s</text>'
+                   % (sx(x), bottom + 14, label))
+        x += .5
+
+    for (points, color) in zip(data, g['graph_colors']):
+        out.append('<polyline fill="none" stroke="%s" points="%s"/>'
+                   % (color, ' '.join(['%.1f,%.1f' % (sx(x), sy(y)) for (x, y) in points])))
+
+    # Legend
+    x = left + g['graph_width'] + g['legend_pad'] * 2
+    line_no = 1
+    for (text, color) in zip(legend_text, g['graph_colors']):
+        y = top + g['legend_pad'] + g['font_height'] * line_no
+        out.append('<rect x="%d" y="%d" width="%d" height="%d" fill="%s"/>'
+                   % (x, y - g['legend_text_indent'] / 2, g['legend_text_indent'] / 2,
+                      g['legend_text_indent'] / 2, color))
+        out.append('<text x="%d" y="%d">%s</text>'
+                   % (x + g['legend_text_indent'], y, escape(str(text))))
+        line_no += 1
+    out.append('</svg>')
+    return '\n'.join(out)
+
+
+def html_table(column_headers, rows, title=None):
+    """
+    Render a list of rows as an HTML table.
+    """
+    out = ['<table>']
+    if title:
+        out.append('<caption>%s</caption>' % (escape(title),))
+    out.append('<tr>%s</tr>' % (''.join(['<th>%s</th>' % (escape(str(h)),)
+                                         for h in column_headers]),))
+    for row in rows:
+        out.append('<tr>%s</tr>' % (''.join(['<td>%s</td>' % (escape(str(v)),)
+                                             for v in row]),))
+    out.append('</table>')
+    return '\n'.join(out)
+
+
+def write_html(filename, title, sections):
+    """
+    Write a single HTML page with the title and the sections, which are
+    strings of HTML (tables or SVG charts).
+    """
+    with open(filename, 'w') as f:
+        f.write("""<html>
+<head>
+<title>%s</title>
+<style>
+table, th, td {
+    border: 1px solid black;
+    border-collapse: collapse;
+    font-family: Helvetica;
+    font-size: 10pt;
+}
+svg {
+    display: block;
+}
+</style>
+</head>
+<body>
+<h2>%s</h2>
+""" % (escape(title), escape(title)))
+        f.write('\n'.join(sections))
+        f.write('\n</body>\n</html>\n')
@@ -0,0 +1,266 @@
+"""
+Write a synthetic investments.xlsx, in the layout s2db expects, and load
+it into investments.db, to measure the commands at scale.
+
+The portfolio is random but plausible: monthly prices are a random walk,
+sells never exceed the shares held, buys are paid for with cash moved
+into the account, positions pay quarterly dividends, and each account
+has a month end snapshot of its holdings (the trade history) and a
+performance review.
+
+s2db reads the three account sheets (Individual, Roth IRA, IRA) by name,
+so there are always three accounts.
+
+Example: 200 symbols, 8 years and 20000 trades in /tmp/big:
+
+    python -m app.synthetic -o /tmp/big -s 200 -y 8 -t 20000
+"""
+
+import argparse
+import calendar
+from datetime import date, datetime, timedelta
+import os
+import random
+
+from app.lazy import lazy_import
+
+openpyxl = lazy_import('openpyxl')
+
+
+# (number, name) of the accounts, in the order of the Perf Reviews columns.
+ACCOUNTS = (('5304-3149', 'Individual'),
+            ('4796-5300', 'Roth IRA'),
+            ('3029-7830', 'IRA'))
+
+# Trade Confirmations columns, from column A.
+TRADE_COLUMNS = ('trade_date', 'account', 'symbol', 'name', 'is_buy', 'n_shares',
+                 'share_price', 'total', 'detail')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description = globals()['__doc__'],
+                                     formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.usage = 'python -m app.synthetic [options]'
+    parser.add_argument('-o', '--out_dir',
+                        default='.',
+                        help='Directory for investments.xlsx and investments.db. '
+                        'Default: %(default)s.')
+    parser.add_argument('-s', '--n_symbols', type=int,
+                        default=50,
+                        help='Number of stocks. Default: %(default)s.')
+    parser.add_argument('-y', '--n_years', type=int,
+                        default=5,
+                        help='Number of years of history. Default: %(default)s.')
+    parser.add_argument('-t', '--n_trades', type=int,
+                        default=2000,
+                        help='Number of trade confirmations. Default: %(default)s.')
+    parser.add_argument('-e', '--end_year', type=int,
+                        default=date.today().year - 1,
+                        help='Last year of history. Default: %(default)s.')
+    parser.add_argument('--seed', type=int,
+                        default=1,
+                        help='Random seed. Default: %(default)s.')
+    parser.add_argument('-n', '--no_db', default=False,
+                        action='store_true',
+                        help='Only write the spreadsheet. '
+                        'Default: %(default)s.')
+    return parser
+
+
+def month_ends(first_year, last_year):
+    """
+    Return the last day of each month from January of first_year to
+    December of last_year, as datetimes.
+    """
+    ends = []
+    for year in range(first_year, last_year + 1):
+        for month in range(1, 13):
+            ends.append(datetime(year, month, calendar.monthrange(year, month)[1]))
+    return ends
+
+
+class Portfolio(object):
+    """
+    The random trades, dividends, prices and holdings.
+    """
+    def __init__(self, n_symbols=50, n_years=5, n_trades=2000, end_year=None, seed=1):
+        rng = random.Random(seed)
+        if end_year is None:
+            end_year = date.today().year - 1
+        self.months = month_ends(end_year - n_years + 1, end_year)
+        self.symbols = ['S%03d' % (i,) for i in range(n_symbols)]
+        self.names = dict([(symbol, '%s Corp' % (symbol,)) for symbol in self.symbols])
+        # prices[symbol][i] is the price at the end of months[i].
+        self.prices = dict()
+        for symbol in self.symbols:
+            price = rng.uniform(10, 200)
+            walk = []
+            for month in self.months:
+                price = max(1.0, price * rng.gauss(1.005, .06))
+                walk.append(round(price, 2))
+            self.prices[symbol] = walk
+        self.trades = []
+        # Key is account number, value is a list of (date, amount, symbol, description).
+        self.activity = dict([(number, []) for (number, name) in ACCOUNTS])
+        # Key is account number, value is a list of (date, [(symbol, n_shares, unit_cost, price)]).
+        self.history = dict([(number, []) for (number, name) in ACCOUNTS])
+        # Key is account number, value is a list of end of month market values.
+        self.market_values = dict([(number, []) for (number, name) in ACCOUNTS])
+        self.make_trades(rng, n_trades)
+
+
+    def make_trades(self, rng, n_trades):
+        first = self.months[0].replace(day=1)
+        n_days = (self.months[-1] - first).days
+        trade_dates = sorted([first + timedelta(days=rng.randrange(n_days + 1))
+                              for i in range(n_trades)])
+        # Key is (account, symbol), value is [n_shares, cost].
+        held = dict()
+        next_trade = 0
+        for (i, month_end) in enumerate(self.months):
+            while next_trade < n_trades and trade_dates[next_trade] <= month_end:
+                self.trade(rng, held, trade_dates[next_trade], i)
+                next_trade += 1
+            for (number, name) in ACCOUNTS:
+                activity = self.activity[number]
+                activity.append((month_end, round(rng.uniform(.5, 20), 2), None, 'Bank interest'))
+                positions = sorted([(symbol, position) for ((account, symbol), position) in held.items()
+                                    if account == number and position[0]])
+                snapshot = [(symbol, n_shares, round(cost / n_shares, 4), self.prices[symbol][i])
+                            for (symbol, (n_shares, cost)) in positions]
+                self.history[number].append((month_end, snapshot))
+                self.market_values[number].append(
+                    round(10000 + sum([n_shares * price for (_, n_shares, _, price) in snapshot]), 2))
+                if month_end.month % 3 == 0:
+                    for (symbol, n_shares, _, price) in snapshot:
+                        activity.append((month_end, round(n_shares * price * .005, 2), symbol,
+                                         '%s dividend' % (self.names[symbol],)))
+
+
+    def trade(self, rng, held, trade_date, month):
+        """
+        Buy, or sell some of a position, on trade_date.
+        """
+        account = rng.choice(ACCOUNTS)[0]
+        symbol = rng.choice(self.symbols)
+        key = (account, symbol)
+        position = held.setdefault(key, [0, 0.0])
+        share_price = round(self.prices[symbol][month] * rng.uniform(.97, 1.03), 2)
+        if position[0] and rng.random() < .4:
+            n_shares = rng.randint(1, position[0])
+            position[1] -= position[1] * n_shares / position[0]
+            position[0] -= n_shares
+            is_buy = 0
+        else:
+            n_shares = rng.randint(1, 50) * 10
+            position[0] += n_shares
+            position[1] += n_shares * share_price
+            is_buy = 1
+        self.trades.append(dict(trade_date=trade_date, account=account, symbol=symbol,
+                                name=self.names[symbol], is_buy=is_buy, n_shares=n_shares,
+                                share_price=share_price))
+        total = round(n_shares * share_price, 2)
+        self.activity[account].append((trade_date, -total if is_buy else total, symbol,
+                                       '%s %s %d' % (self.names[symbol],
+                                                     'bought' if is_buy else 'sold', n_shares)))
+        # Buys are paid for with cash moved into the account, and the
+        # proceeds of sells are moved out, so the market value only grows
+        # with the prices.
+        self.activity[account].append((trade_date, total if is_buy else -total, None,
+                                       'Transfer cash'))
+
+
+    def workbook(self):
+        """
+        Return the portfolio as an openpyxl workbook.
+        """
+        wb = openpyxl.Workbook(write_only=True)
+        self.write_trade_confirmations(wb.create_sheet('Trade Confirmations'))
+        self.write_performance_reviews(wb.create_sheet('Perf Reviews'))
+        for (number, name) in ACCOUNTS:
+            self.write_account(wb.create_sheet(name), number)
+        return wb
+
+
+    def write_trade_confirmations(self, ws):
+        # Rows 3 and 4 are the account numbers and names, in columns B on.
+        ws.append([])
+        ws.append([])
+        ws.append([None] + [number for (number, name) in ACCOUNTS])
+        ws.append([None] + [name for (number, name) in ACCOUNTS])
+        ws.append([])
+        ws.append(list(TRADE_COLUMNS))
+        n_shares_col = chr(ord('A') + TRADE_COLUMNS.index('n_shares'))
+        share_price_col = chr(ord('A') + TRADE_COLUMNS.index('share_price'))
+        numbers = [number for (number, name) in ACCOUNTS]
+        for (i, trade) in enumerate(self.trades):
+            row = 7 + i
+            # As in the real sheet, the account refers to the cell with
+            # its number, and the total is a formula.
+            account = '=%s3' % (chr(ord('B') + numbers.index(trade['account'])),)
+            total = '=%s%d*%s%d' % (n_shares_col, row, share_price_col, row)
+            ws.append([trade['trade_date'], account, trade['symbol'], trade['name'],
+                       trade['is_buy'], trade['n_shares'], trade['share_price'], total, None])
+
+
+    def write_performance_reviews(self, ws):
+        # Reviews start on row 7. The market values are in columns G, I and K.
+        for i in range(6):
+            ws.append([])
+        for (i, month_end) in enumerate(self.months):
+            row = [month_end] + [None] * 10
+            for (col, (number, name)) in zip((6, 8, 10), ACCOUNTS):
+                row[col] = self.market_values[number][i]
+            ws.append(row)
+
+
+    def write_account(self, ws, number):
+        # The activity is in columns A-D and ends with END. The trade
+        # history is in columns G-K and N of the same rows, with the date
+        # only on the first row of each snapshot.
+        activity = sorted(self.activity[number], key=lambda act: act[0])
+        activity_rows = [[act_date, amount, symbol, description]
+                         for (act_date, amount, symbol, description) in activity]
+        activity_rows.append(['END'])
+        history_rows = []
+        for (month_end, snapshot) in self.history[number]:
+            for (i, (symbol, n_shares, unit_cost, price)) in enumerate(snapshot):
+                history_rows.append([month_end if i == 0 else None, symbol, n_shares,
+                                     unit_cost, price, None, None, self.names[symbol]])
+        ws.append([None, number])
+        ws.append([])
+        ws.append([])
+        ws.append([])
+        for i in range(max(len(activity_rows), len(history_rows))):
+            row = activity_rows[i] if i < len(activity_rows) else []
+            if i < len(history_rows):
+                row = row + [None] * (6 - len(row)) + history_rows[i]
+            ws.append(row)
+
+
+def write(out_dir, n_symbols=50, n_years=5, n_trades=2000, end_year=None, seed=1, db=True):
+    """
+    Write out_dir/investments.xlsx, and load it into out_dir/investments.db
+    with s2db. Returns the Portfolio.
+    """
+    from app.commands import s2db
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+    portfolio = Portfolio(n_symbols, n_years, n_trades, end_year, seed)
+    in_file = os.path.join(out_dir, 'investments.xlsx')
+    portfolio.workbook().save(in_file)
+    if db:
+        s2db.action(s2db.build_parser().parse_args(['-f', in_file,
+                                                     '-d', os.path.join(out_dir, 'investments.db')]))
+    return portfolio
+
+
+def action(args):
+    portfolio = write(args.out_dir, args.n_symbols, args.n_years, args.n_trades,
+                      args.end_year, args.seed, not args.no_db)
+    print('%d trades, %d months in %s' % (len(portfolio.trades), len(portfolio.months),
+                                          args.out_dir))
+
+
+if __name__ == '__main__':
+    action(build_parser().parse_args())
@@ -0,0 +1,73 @@
+"""
+Convert dates to the fractional year values used for the x axis of the charts.
+
+A date is plotted at the end of its month: yyyy + (day of year - 1) / 366.
+Use 366 to account for leap years that have that many days. Every date
+in the same month maps to the same value, so the values are looked up in a
+table keyed by (year, month) and only calculated once per month.
+"""
+
+import calendar
+from datetime import date, timedelta
+
+
+# Key is (year, month), value is the fractional year.
+_month_ends = dict()
+
+
+def month_end_year(year, month):
+    """
+    Return the fractional year for the end of the month.
+    """
+    key = (year, month)
+    if key not in _month_ends:
+        # Create a date, with the year and month and the end of month
+        # day (from calendar.monthrange). With timetuple one can get
+        # the day of the year, and then convert to a fraction.
+        end = date(year, month, calendar.monthrange(year, month)[1])
+        _month_ends[key] = year + (end.timetuple().tm_yday - 1) / 366.0
+    return _month_ends[key]
+
+
+def year_fraction(d):
+    """
+    Convert a date (or datetime) to a float yyyy.yearFraction.
+    """
+    return month_end_year(d.year, d.month)
+
+
+def year_fractions(dates):
+    """
+    Convert a sequence of dates to a list of fractional years.
+    """
+    lookup = _month_ends
+    fractions = []
+    for d in dates:
+        key = (d.year, d.month)
+        if key in lookup:
+            fractions.append(lookup[key])
+        else:
+            fractions.append(month_end_year(d.year, d.month))
+    return fractions
+
+
+def series(rows, date_col, value_col):
+    """
+    Build the (x,y) points for a graph from a list of row dicts.
+    """
+    return list(zip(year_fractions([row[date_col] for row in rows]),
+                    [row[value_col] for row in rows]))
+
+
+def tick_label(x):
+    """
+    Format a fractional year as a month and year, e.g. 'Jun 2021'.
+    Can be used as a reportlab axis labelTextFormat.
+    """
+    year = int(x)
+    day_of_year = int(round((x - year) * 366))
+    d = date(year, 1, 1) + timedelta(days=day_of_year)
+    if d.year != year:
+        # Rounding error at the end of a non-leap year.
+        d = date(year, 12, 31)
+    return d.strftime('%b %Y')
@@ -0,0 +1,113 @@
+"""
+Find wash sales: a loss on a sale in a taxable account, where shares of
+the same security were bought within 30 days before or after the sale in
+any account, including IRAs.
+
+The buys of each symbol are kept sorted by date, so the replacement
+buys of a sale are found with two bisects instead of comparing every
+sale with every buy. Each replacement share is only used once, and
+shares that have been sold (in this sale or an earlier one) are not
+replacements.
+
+Not handled: adding the disallowed loss to the cost basis of the
+replacement shares.
+"""
+
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+
+
+WINDOW_DAYS = 30
+
+# The Form 8949 column (f) code for a wash sale.
+WASH_SALE = 'W'
+
+# code is WASH_SALE or None. disallowed_loss is the amount to enter in
+# column (g), a positive number.
+Adjustment = namedtuple('Adjustment', 'code disallowed_loss')
+
+NO_ADJUSTMENT = Adjustment(None, 0.0)
+
+
+class WashSales(object):
+    """
+    Index of the buys of each symbol, for finding replacement shares.
+    """
+    def __init__(self, trades):
+        """
+        trades - trade_confirmation rows of all accounts.
+        """
+        # Key is symbol, value is a list of the buys sorted by trade_date,
+        # and the list of their date ordinals for bisect.
+        self.buys = dict()
+        self.dates = dict()
+        # Key is the buy id, value is the replacement shares not used or sold yet.
+        self.available = dict()
+        for trade in sorted([t for t in trades if t['is_buy']], key=lambda t: t['trade_date']):
+            symbol = trade['symbol']
+            if symbol not in self.buys:
+                self.buys[symbol] = []
+                self.dates[symbol] = []
+            self.buys[symbol].append(trade)
+            self.dates[symbol].append(trade['trade_date'].toordinal())
+            self.available[trade['id']] = trade['n_shares']
+
+
+    def replacements(self, sell, exclude_id=None):
+        """
+        Return the buys of the symbol within 30 days of the sell.
+        exclude_id is the buy whose shares were sold.
+        """
+        dates = self.dates.get(sell['symbol'])
+        if not dates:
+            return []
+        day = sell['trade_date'].toordinal()
+        first = bisect_left(dates, day - WINDOW_DAYS)
+        last = bisect_right(dates, day + WINDOW_DAYS)
+        return [buy for buy in self.buys[sell['symbol']][first:last]
+                if buy['id'] != exclude_id]
+
+
+    def sold(self, match):
+        """
+        Remove the shares a Match sold from the replacement shares.
+        """
+        if match.buy:
+            buy_id = match.buy['id']
+            self.available[buy_id] = max(self.available[buy_id] - match.n_shares, 0)
+
+
+    def adjust_sale(self, matches, taxable=True):
+        """
+        Return the Adjustments of the Matches (see app.lots) of one sell.
+        All of the shares the sell closes are taken out of the
+        replacement shares first, so a sale of several lots can't
+        replace itself. Sells must be passed in order.
+        """
+        for match in matches:
+            self.sold(match)
+        return [self.adjust(match, taxable) for match in matches]
+
+
+    def adjust(self, match, taxable=True):
+        """
+        Return the Adjustment for a Match. The disallowed loss is the part
+        of the loss covered by replacement shares. Use adjust_sale, which
+        first takes the sold shares out of the replacements.
+        """
+        loss = match.cost - match.proceeds
+        if not taxable or loss <= 0:
+            return NO_ADJUSTMENT
+        exclude_id = match.buy['id'] if match.buy else None
+        needed = match.n_shares
+        for buy in self.replacements(match.sell, exclude_id):
+            used = min(needed, self.available[buy['id']])
+            self.available[buy['id']] -= used
+            needed -= used
+            if not needed:
+                break
+        replaced = match.n_shares - needed
+        if not replaced:
+            return NO_ADJUSTMENT
+        return Adjustment(WASH_SALE, loss * replaced / match.n_shares)
+
@@ -0,0 +1,134 @@
+"""
+What is the short and long term gain if N shares are sold today?
+
+The open lots of each symbol+account are what is left after matching
+the past sells with app.lots. For each way of choosing the lots to sell
+(FIFO, LIFO, HIFO) the lots are put in that order once, with running
+totals of shares and cost, overall and for the long term lots. Selling
+N shares is then a bisect into the running shares plus a partial lot,
+so each question is answered in O(log lots).
+"""
+
+from bisect import bisect_left
+from collections import namedtuple
+
+from app.lots import CAPITAL_ASSETS, LotMatcher, held_long_term
+
+
+# Orders for choosing the lots to sell.
+ORDERS = ('fifo', 'lifo', 'hifo')
+
+Impact = namedtuple('Impact', 'method n_shares proceeds short_shares short_cost short_gain '
+                    'long_shares long_cost long_gain')
+
+
+class SaleIndex(object):
+    """
+    Running totals of the open lots of one symbol+account, in the order
+    they would be sold.
+    """
+    def __init__(self, lots, as_of):
+        """
+        lots - app.lots.Lot, already in the order to sell them.
+        """
+        self.lots = lots
+        self.is_long = [held_long_term(lot.trade['trade_date'], as_of) for lot in lots]
+        # Element i is the total for lots[0:i].
+        self.cum_shares = [0]
+        self.cum_cost = [0.0]
+        self.cum_long_shares = [0]
+        self.cum_long_cost = [0.0]
+        for (lot, is_long) in zip(lots, self.is_long):
+            cost = lot.unit_cost * lot.n_shares
+            self.cum_shares.append(self.cum_shares[-1] + lot.n_shares)
+            self.cum_cost.append(self.cum_cost[-1] + cost)
+            self.cum_long_shares.append(self.cum_long_shares[-1] + (lot.n_shares if is_long else 0))
+            self.cum_long_cost.append(self.cum_long_cost[-1] + (cost if is_long else 0.0))
+
+
+    def n_shares(self):
+        return self.cum_shares[-1]
+
+
+    def sell(self, n_shares):
+        """
+        Return (short_shares, short_cost, long_shares, long_cost) for
+        selling n_shares.
+        """
+        if n_shares > self.n_shares():
+            raise ValueError('Only %s shares are held' % (self.n_shares(),))
+        # The lots before k are sold entirely, and part of lot k.
+        k = bisect_left(self.cum_shares, n_shares) - 1
+        if k < 0:
+            k = 0
+        long_shares = self.cum_long_shares[k]
+        long_cost = self.cum_long_cost[k]
+        partial = n_shares - self.cum_shares[k]
+        partial_cost = 0.0
+        if partial:
+            partial_cost = self.lots[k].unit_cost * partial
+            if self.is_long[k]:
+                long_shares += partial
+                long_cost += partial_cost
+        cost = self.cum_cost[k] + partial_cost
+        return (n_shares - long_shares, cost - long_cost, long_shares, long_cost)
+
+
+class WhatIf(object):
+    """
+    Answer what-if questions about selling shares.
+    """
+    def __init__(self, trades, as_of, method='fifo'):
+        """
+        trades - trade_confirmation rows, with trade_date a datetime.
+
+        as_of - the date of the proposed sales.
+
+        method - how the past sells were matched with their lots.
+        """
+        self.as_of = as_of
+        matcher = LotMatcher(method)
+        matcher.match([trade for trade in trades
+                       if trade['trade_type'] in CAPITAL_ASSETS and trade['trade_date'] <= as_of])
+        # Key is (symbol, account), value is a dict of SaleIndex keyed by order.
+        self.indexes = dict()
+        for (key, open_lots) in matcher.open_lots.items():
+            lots = [lot for lot in open_lots if lot.n_shares]
+            if not lots:
+                continue
+            by_date = sorted(lots, key=lambda lot: lot.trade['trade_date'])
+            self.indexes[key] = dict(
+                fifo=SaleIndex(by_date, as_of),
+                lifo=SaleIndex(by_date[::-1], as_of),
+                hifo=SaleIndex(sorted(by_date, key=lambda lot: -lot.unit_cost), as_of))
+
+
+    def accounts(self, symbol):
+        """
+        Return the accounts that hold the symbol.
+        """
+        return sorted([account for (sym, account) in self.indexes if sym == symbol])
+
+
+    def n_shares(self, symbol, account):
+        """
+        Return the number of shares held, 0 if none.
+        """
+        index = self.indexes.get((symbol, account))
+        return index['fifo'].n_shares() if index else 0
+
+
+    def impact(self, symbol, account, n_shares, price, method='fifo'):
+        """
+        Return the Impact of selling n_shares of symbol from account at
+        price, choosing the lots with method (fifo, lifo or hifo).
+        """
+        if method not in ORDERS:
+            raise ValueError('Unknown lot method %s' % (method,))
+        index = self.indexes.get((symbol, account))
+        if index is None:
+            raise ValueError('No open lots of %s in %s' % (symbol, account))
+        (short_shares, short_cost, long_shares, long_cost) = index[method].sell(n_shares)
+        return Impact(method, n_shares, price * n_shares,
+                      short_shares, short_cost, price * short_shares - short_cost,
+                      long_shares, long_cost, price * long_shares - long_cost)
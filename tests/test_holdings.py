@@ -0,0 +1,56 @@
+"""
+Tests of the holdings replay on a small example.
+"""
+
+from datetime import datetime
+import unittest
+
+from app.holdings import Holdings
+
+
+def day(n):
+    return datetime(2023, 1, n)
+
+
+class HoldingsTest(unittest.TestCase):
+    def setUp(self):
+        trades = [dict(trade_date=day(2), account='A', symbol='XYZ', is_buy=1, n_shares=100,
+                       total=1000.0, trade_type='stock'),
+                  dict(trade_date=day(3), account='A', symbol='XYZ', is_buy=0, n_shares=5,
+                       total=10.0, trade_type='call'),
+                  dict(trade_date=day(9), account='A', symbol='XYZ', is_buy=0, n_shares=50,
+                       total=600.0, trade_type='stock')]
+        activities = [dict(activity_date=day(4), account='A', symbol='XYZ', amount=-25.0,
+                           n_shares=2.5, activity_type='dividend reinvestment'),
+                      dict(activity_date=day(5), account='A', symbol='XYZ', amount=None,
+                           n_shares=10, activity_type='stock distribution'),
+                      dict(activity_date=day(6), account='A', symbol='XYZ', amount=25.0,
+                           n_shares=None, activity_type='dividend')]
+        self.holdings = Holdings(trades, activities, interval=2)
+
+
+    def test_options_left_out(self):
+        self.assertEqual(self.holdings.at('A', day(3)), dict(XYZ=(100, 1000.0)))
+
+
+    def test_reinvestment(self):
+        self.assertEqual(self.holdings.at('A', day(4)), dict(XYZ=(102.5, 1025.0)))
+
+
+    def test_distribution(self):
+        self.assertEqual(self.holdings.at('A', day(5)), dict(XYZ=(112.5, 1025.0)))
+        # A dividend paid in cash doesn't change the shares.
+        self.assertEqual(self.holdings.at('A', day(6)), dict(XYZ=(112.5, 1025.0)))
+
+
+    def test_sell(self):
+        self.assertEqual(self.holdings.at('A', day(9)), dict(XYZ=(62.5, 1025.0 * 62.5 / 112.5)))
+
+
+    def test_before_and_unknown_account(self):
+        self.assertEqual(self.holdings.at('A', day(1)), dict())
+        self.assertEqual(self.holdings.at('B', day(9)), dict())
+
+
+if __name__ == '__main__':
+    unittest.main()
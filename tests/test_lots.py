@@ -0,0 +1,47 @@
+"""
+Tests of app.lots: the holding period and long term dates.
+"""
+
+from datetime import datetime, timedelta
+import unittest
+
+from app.lots import held_long_term, long_term_date
+
+
+class HoldingPeriodTest(unittest.TestCase):
+    def test_anniversary_is_short_term(self):
+        self.assertFalse(held_long_term(datetime(2024, 1, 10), datetime(2025, 1, 10)))
+        self.assertFalse(held_long_term(datetime(2023, 1, 10), datetime(2024, 1, 10)))
+
+
+    def test_day_after_anniversary_is_long_term(self):
+        self.assertTrue(held_long_term(datetime(2024, 1, 10), datetime(2025, 1, 11)))
+        self.assertTrue(held_long_term(datetime(2023, 1, 10), datetime(2024, 1, 11)))
+
+
+    def test_leap_day(self):
+        # Feb 29 has its anniversary on Feb 28.
+        self.assertFalse(held_long_term(datetime(2024, 2, 29), datetime(2025, 2, 28)))
+        self.assertTrue(held_long_term(datetime(2024, 2, 29), datetime(2025, 3, 1)))
+        # A year that holds a Feb 29 is still a year.
+        self.assertFalse(held_long_term(datetime(2023, 3, 1), datetime(2024, 3, 1)))
+        self.assertTrue(held_long_term(datetime(2023, 3, 1), datetime(2024, 3, 2)))
+
+
+    def test_long_term_date(self):
+        self.assertEqual(long_term_date(datetime(2023, 1, 10)), datetime(2024, 1, 11))
+        self.assertEqual(long_term_date(datetime(2024, 1, 10)), datetime(2025, 1, 11))
+        self.assertEqual(long_term_date(datetime(2024, 2, 29)), datetime(2025, 3, 1))
+        self.assertEqual(long_term_date(datetime(2023, 12, 31)), datetime(2025, 1, 1))
+
+
+    def test_long_term_date_agrees_with_held_long_term(self):
+        for day in range(3 * 366):
+            acquired_date = datetime(2022, 1, 1) + timedelta(days=day)
+            first = long_term_date(acquired_date)
+            self.assertTrue(held_long_term(acquired_date, first))
+            self.assertFalse(held_long_term(acquired_date, first - timedelta(days=1)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+"""
+Tests of the holding period stored in realized_gain: the matches of the
+sells with their buys, and whether each is long term.
+"""
+
+from datetime import datetime
+import unittest
+
+from app.lots import held_days, is_long_term, match_lots
+
+
+def trade(trade_id, date, is_buy, n_shares, total):
+    return dict(id=trade_id, symbol='XYZ', account='A', trade_date=date,
+                is_buy=is_buy, n_shares=n_shares, total=total, trade_type='stock')
+
+
+class RealizedGainTermTest(unittest.TestCase):
+    def terms(self, bought, sold):
+        """
+        Return is_long_term of the match of a sale on sold of a buy on bought.
+        """
+        (match,) = match_lots([trade(1, bought, 1, 10, 100.0), trade(2, sold, 0, 10, 150.0)])
+        return is_long_term(match)
+
+
+    def test_anniversary(self):
+        self.assertFalse(self.terms(datetime(2024, 1, 10), datetime(2025, 1, 10)))
+        self.assertTrue(self.terms(datetime(2024, 1, 10), datetime(2025, 1, 11)))
+
+
+    def test_sold_in_leap_year(self):
+        # 366 days, but the day after the anniversary.
+        self.assertTrue(self.terms(datetime(2023, 1, 10), datetime(2024, 1, 11)))
+        self.assertFalse(self.terms(datetime(2023, 3, 10), datetime(2024, 3, 10)))
+
+
+    def test_bought_on_leap_day(self):
+        self.assertFalse(self.terms(datetime(2024, 2, 29), datetime(2025, 2, 28)))
+        self.assertTrue(self.terms(datetime(2024, 2, 29), datetime(2025, 3, 1)))
+
+
+    def test_without_purchase(self):
+        (match,) = match_lots([trade(2, datetime(2025, 1, 10), 0, 10, 150.0)])
+        self.assertIsNone(held_days(match))
+        self.assertFalse(is_long_term(match))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+"""
+Tests of the stock charts, with the trade history read once and used
+for many requests.
+"""
+
+import importlib.util
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import unittest
+
+
+TOP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@unittest.skipUnless(importlib.util.find_spec('openpyxl'), 'openpyxl is needed')
+class RenderChartsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.env = dict(os.environ, PYTHONPATH=TOP_DIR)
+        self.python(['-m', 'app.synthetic', '-o', self.tmp.name, '-s', '3', '-y', '2', '-t', '60'])
+        # A commentary row on the last history date.
+        with sqlite3.connect(os.path.join(self.tmp.name, 'investments.db')) as conn:
+            conn.execute("""INSERT INTO trade_history (account, history_date, symbol, n_shares, unit_cost, current_price, name)
+SELECT account, max(history_date), '# note', 0, 0, 0, 'note' FROM trade_history""")
+        for name in ('a', 'b'):
+            os.mkdir(os.path.join(self.tmp.name, name))
+
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+
+    def python(self, args, stdin=None):
+        return subprocess.run([sys.executable] + args, input=stdin, cwd=self.tmp.name,
+                              env=self.env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              universal_newlines=True, check=True).stdout
+
+
+    def read(self, name):
+        with open(os.path.join(self.tmp.name, name, 'charts.html')) as f:
+            return f.read()
+
+
+    def test_charts_twice(self):
+        output = self.python(['-m', 'app.commands.serve'],
+                             'render_charts -f html -o a\nrender_charts -f html -o b\n')
+        self.assertEqual(output.count('END 0\n'), 2, output)
+        self.assertEqual(self.read('a').count('<svg'), 9)
+        self.assertEqual(self.read('a'), self.read('b'))
+
+
+if __name__ == '__main__':
+    unittest.main()
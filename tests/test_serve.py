@@ -0,0 +1,52 @@
+"""
+Tests of the serve command, which runs many commands in one process.
+"""
+
+import importlib.util
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+
+TOP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@unittest.skipUnless(importlib.util.find_spec('reportlab') and importlib.util.find_spec('openpyxl'),
+                     'reportlab and openpyxl are needed')
+class ServeReportTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.env = dict(os.environ, PYTHONPATH=TOP_DIR, RL_invariant='1')
+        self.python(['-m', 'app.synthetic', '-o', self.tmp.name, '-s', '3', '-y', '2', '-t', '60'])
+
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+
+    def python(self, args, stdin=None):
+        return subprocess.run([sys.executable] + args, input=stdin, cwd=self.tmp.name,
+                              env=self.env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              universal_newlines=True, check=True).stdout
+
+
+    def read(self, name):
+        with open(os.path.join(self.tmp.name, name), 'rb') as f:
+            return f.read()
+
+
+    def test_report_twice(self):
+        # No date or time in the footer, so the reports can be compared.
+        requests = ''.join(['report -o %s -f "Page %%p of %%P|Report|" %s\n' % (name, options)
+                            for (name, options) in (('a.pdf', ''), ('b.pdf', ''),
+                                                    ('c.pdf', '-s'), ('d.pdf', '-s'))])
+        output = self.python(['-m', 'app.commands.serve'], requests)
+        self.assertEqual(output.count('END 0\n'), 4, output)
+        self.assertEqual(self.read('a.pdf'), self.read('b.pdf'))
+        self.assertEqual(self.read('c.pdf'), self.read('d.pdf'))
+
+
+if __name__ == '__main__':
+    unittest.main()
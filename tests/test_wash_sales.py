@@ -0,0 +1,74 @@
+"""
+Tests of the wash sale rules on small examples.
+"""
+
+from datetime import datetime
+import unittest
+
+from app.lots import match_lots
+from app.wash_sales import NO_ADJUSTMENT, WASH_SALE, Adjustment, WashSales
+
+
+def trade(trade_id, date, is_buy, n_shares, price):
+    return dict(id=trade_id, symbol='XYZ', account='A',
+                trade_date=datetime.strptime(date, '%Y-%m-%d'),
+                is_buy=is_buy, n_shares=n_shares, total=n_shares * price, trade_type='stock')
+
+
+def adjustments(trades):
+    """
+    Return the Adjustments of the matches of the sells, in order.
+    """
+    wash_sales = WashSales(trades)
+    matches = match_lots(trades)
+    result = []
+    for sell_id in sorted(set([match.sell['id'] for match in matches])):
+        result += wash_sales.adjust_sale([match for match in matches
+                                          if match.sell['id'] == sell_id])
+    return result
+
+
+class WashSalesTest(unittest.TestCase):
+    def test_everything_sold(self):
+        # Selling every lot at a loss, with nothing bought back, is not a wash sale.
+        result = adjustments([trade(1, '2023-01-02', 1, 100, 15.0),
+                              trade(2, '2023-01-06', 1, 100, 15.0),
+                              trade(3, '2023-01-12', 0, 200, 10.0)])
+        self.assertEqual(result, [NO_ADJUSTMENT, NO_ADJUSTMENT])
+
+
+    def test_sold_earlier(self):
+        # Shares sold earlier are not replacements either.
+        result = adjustments([trade(1, '2023-01-02', 1, 100, 15.0),
+                              trade(2, '2023-01-06', 1, 100, 15.0),
+                              trade(3, '2023-01-08', 0, 100, 10.0),
+                              trade(4, '2023-01-12', 0, 100, 10.0)])
+        self.assertEqual(result[1], NO_ADJUSTMENT)
+
+
+    def test_lot_held(self):
+        # Selling the first lot at a loss while the second is held is.
+        result = adjustments([trade(1, '2023-01-02', 1, 100, 15.0),
+                              trade(2, '2023-01-06', 1, 100, 15.0),
+                              trade(3, '2023-01-12', 0, 100, 10.0)])
+        self.assertEqual(result, [Adjustment(WASH_SALE, 500.0)])
+
+
+    def test_bought_back(self):
+        # So is buying back within 30 days after the sale.
+        result = adjustments([trade(1, '2023-01-02', 1, 100, 15.0),
+                              trade(2, '2023-01-12', 0, 100, 10.0),
+                              trade(3, '2023-02-01', 1, 50, 11.0)])
+        self.assertEqual(result, [Adjustment(WASH_SALE, 250.0)])
+
+
+    def test_not_taxable(self):
+        trades = [trade(1, '2023-01-02', 1, 100, 15.0),
+                  trade(2, '2023-01-06', 1, 100, 15.0),
+                  trade(3, '2023-01-12', 0, 100, 10.0)]
+        (match,) = match_lots(trades)
+        self.assertEqual(WashSales(trades).adjust_sale([match], taxable=False), [NO_ADJUSTMENT])
+
+
+if __name__ == '__main__':
+    unittest.main()
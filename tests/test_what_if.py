@@ -0,0 +1,41 @@
+"""
+Tests of the short and long term split of a what-if sale.
+"""
+
+from datetime import datetime
+import unittest
+
+from app.what_if import WhatIf
+
+
+def trade(trade_id, date, is_buy, n_shares, total):
+    return dict(id=trade_id, symbol='XYZ', account='A', trade_date=date,
+                is_buy=is_buy, n_shares=n_shares, total=total, trade_type='stock')
+
+
+class WhatIfTermTest(unittest.TestCase):
+    def setUp(self):
+        self.trades = [trade(1, datetime(2024, 1, 10), 1, 10, 100.0),
+                       trade(2, datetime(2024, 2, 29), 1, 20, 300.0)]
+
+
+    def test_anniversary(self):
+        impact = WhatIf(self.trades, datetime(2025, 1, 10)).impact('XYZ', 'A', 10, 20.0)
+        self.assertEqual((impact.short_shares, impact.long_shares), (10, 0))
+        self.assertEqual(impact.short_gain, 100.0)
+
+
+    def test_day_after_anniversary(self):
+        impact = WhatIf(self.trades, datetime(2025, 1, 11)).impact('XYZ', 'A', 10, 20.0)
+        self.assertEqual((impact.short_shares, impact.long_shares), (0, 10))
+        self.assertEqual(impact.long_gain, 100.0)
+
+
+    def test_bought_on_leap_day(self):
+        for (as_of, long_shares) in ((datetime(2025, 2, 28), 10), (datetime(2025, 3, 1), 30)):
+            impact = WhatIf(self.trades, as_of).impact('XYZ', 'A', 30, 20.0)
+            self.assertEqual((impact.short_shares, impact.long_shares), (30 - long_shares, long_shares))
+
+
+if __name__ == '__main__':
+    unittest.main()